@@ -0,0 +1,219 @@
+import math
+from array import array
+
+# NumPy необязателен: без него столбцы хранятся в array.array, а расчёты идут циклами Python
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Столбцы снимка: (имя, столбец Сделки, тип array). Коды без значения хранятся как -1,
+# нечисловые суммы — как NaN, чтобы столбцы оставались однотипными
+SNAPSHOT_COLUMNS = (
+    ('key', 'Код_сделки', 'q'),
+    ('client', 'IFNULL(Код_клиента, -1)', 'q'),
+    ('service', 'IFNULL(Код_услуги, -1)', 'q'),
+    ('amount', "CASE WHEN typeof(Сумма) IN ('integer', 'real') THEN Сумма END", 'd'),
+    ('commission', "CASE WHEN typeof(Комиссионные) IN ('integer', 'real') THEN Комиссионные END", 'd'),
+)
+SELECT_DEALS = f"SELECT {', '.join(column for _, column, _ in SNAPSHOT_COLUMNS)} FROM Сделки"
+NAN = float('nan')
+
+
+def typed_column(values, typecode):
+    # Столбец порции строк: NULL в числах становится NaN
+    if typecode == 'd':
+        values = [NAN if value is None else value for value in values]
+    if np is not None:
+        return np.array(values, dtype=np.int64 if typecode == 'q' else np.float64)
+    return array(typecode, values)
+
+
+class DealsSnapshot:
+    # Столбцовый снимок Сделки в памяти (около 40 байт на сделку) для фильтров, группировок и перцентилей.
+    # refresh дочитывает только сделки, изменённые после загрузки, по журналу изменений
+    def __init__(self, db, chunk_size=50000, reload_ratio=0.2):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.reload_ratio = reload_ratio  # при большей доле изменённых сделок снимок читается заново
+        self.columns = {}
+        self.watermark = 0
+
+    def __len__(self):
+        return len(self.columns['key']) if self.columns else 0
+
+    def load(self):
+        # Журнал и таблица читаются в одной транзакции: отметка соответствует снимку
+        with self.db.transaction() as conn:
+            self.watermark = self.db.change_watermark()
+            c = conn.cursor()
+            c.execute(SELECT_DEALS)
+            self.columns = self.read_chunks(c)
+        return self
+
+    def refresh(self):
+        # Изменённые и удалённые сделки убираются из столбцов, их текущие строки дописываются в конец
+        if not self.columns:
+            return self.load()
+        with self.db.transaction() as conn:
+            watermark = self.db.change_watermark()
+            if watermark == self.watermark:
+                return self
+            c = conn.cursor()
+            c.execute("SELECT COUNT(DISTINCT Ключ) FROM Журнал_изменений WHERE Таблица = 'Сделки' AND Номер > ?",
+                      (self.watermark,))
+            if c.fetchone()[0] > len(self) * self.reload_ratio:
+                return self.load()
+            changed = set(key for key, in c.execute("SELECT DISTINCT Ключ FROM Журнал_изменений "
+                                                    "WHERE Таблица = 'Сделки' AND Номер > ?", (self.watermark,)))
+            c.execute(f"{SELECT_DEALS} WHERE Код_сделки IN (SELECT Ключ FROM Журнал_изменений "
+                      f"WHERE Таблица = 'Сделки' AND Номер > ?)", (self.watermark,))
+            fresh = self.read_chunks(c)
+        if np is not None:
+            keep = ~np.isin(self.columns['key'], np.fromiter(changed, dtype=np.int64, count=len(changed)))
+            self.columns = {name: np.concatenate((values[keep], fresh[name])) for name, values in self.columns.items()}
+        else:
+            keep = [key not in changed for key in self.columns['key']]
+            self.columns = {name: array(values.typecode, (value for value, kept in zip(values, keep) if kept)) +
+                            fresh[name] for name, values in self.columns.items()}
+        self.watermark = watermark
+        return self
+
+    def read_chunks(self, c):
+        # Порции fetchmany сразу раскладываются по типизированным столбцам
+        parts = {name: [] for name, _, _ in SNAPSHOT_COLUMNS}
+        while True:
+            rows = c.fetchmany(self.chunk_size)
+            if not rows:
+                break
+            for (name, _, typecode), values in zip(SNAPSHOT_COLUMNS, zip(*rows)):
+                parts[name].append(typed_column(values, typecode))
+        columns = {}
+        for name, _, typecode in SNAPSHOT_COLUMNS:
+            if np is not None:
+                columns[name] = (np.concatenate(parts[name]) if parts[name]
+                                 else np.empty(0, dtype=np.int64 if typecode == 'q' else np.float64))
+            else:
+                columns[name] = array(typecode)
+                for part in parts[name]:
+                    columns[name].extend(part)
+        return columns
+
+    def mask(self, client=None, service=None, amount=None, commission=None):
+        # Отбор сделок: коды — на равенство, суммы — диапазоны (от, до) с открытыми концами None
+        conditions = [(self.columns[name], value) for name, value in (('client', client), ('service', service),
+                                                                      ('amount', amount), ('commission', commission))
+                      if value is not None]
+        if np is not None:
+            selected = np.ones(len(self), dtype=bool)
+            for values, condition in conditions:
+                if isinstance(condition, (tuple, list)):
+                    low, high = condition
+                    if low is not None:
+                        selected &= values >= low
+                    if high is not None:
+                        selected &= values <= high
+                else:
+                    selected &= values == condition
+            return selected
+        selected = [True] * len(self)
+        for values, condition in conditions:
+            if isinstance(condition, (tuple, list)):
+                low, high = condition
+                selected = [chosen and not math.isnan(value) and (low is None or value >= low) and
+                            (high is None or value <= high) for chosen, value in zip(selected, values)]
+            else:
+                selected = [chosen and value == condition for chosen, value in zip(selected, values)]
+        return selected
+
+    def select(self, name, selected=None):
+        values = self.columns[name]
+        if selected is None:
+            return values
+        if np is not None:
+            return values[selected]
+        return [value for value, chosen in zip(values, selected) if chosen]
+
+    def summary(self, selected=None):
+        # Число сделок, суммы, средняя сумма и доля комиссионных в обороте
+        amount = self.select('amount', selected)
+        commission = self.select('commission', selected)
+        if np is not None:
+            count = len(amount)
+            total = float(np.nansum(amount))
+            commission_total = float(np.nansum(commission))
+            known = amount[~np.isnan(amount)]
+            low, high = (float(known.min()), float(known.max())) if len(known) else (None, None)
+        else:
+            count = len(amount)
+            known = [value for value in amount if not math.isnan(value)]
+            total = math.fsum(known)
+            commission_total = math.fsum(value for value in commission if not math.isnan(value))
+            low, high = (min(known), max(known)) if known else (None, None)
+        return {'count': count, 'amount': total, 'commission': commission_total,
+                'average': total / len(known) if len(known) else 0.0, 'min': low, 'max': high,
+                'commission_ratio': commission_total / total if total else 0.0}
+
+    def percentiles(self, name='amount', q=(5, 25, 50, 75, 95), selected=None):
+        # Линейная интерполяция, как у numpy.percentile; NaN не учитываются
+        values = self.select(name, selected)
+        if np is not None:
+            known = values[~np.isnan(values)]
+            if not len(known):
+                return {p: None for p in q}
+            return dict(zip(q, (float(value) for value in np.percentile(known, q))))
+        known = sorted(value for value in values if not math.isnan(value))
+        result = {}
+        for p in q:
+            if not known:
+                result[p] = None
+                continue
+            position = (len(known) - 1) * p / 100
+            lower = math.floor(position)
+            upper = min(lower + 1, len(known) - 1)
+            result[p] = known[lower] + (known[upper] - known[lower]) * (position - lower)
+        return result
+
+    def histogram(self, name='amount', bins=20, selected=None):
+        # Распределение сумм: границы корзин и число сделок в каждой
+        values = self.select(name, selected)
+        if np is not None:
+            known = values[~np.isnan(values)]
+            if not len(known):
+                return {'edges': [], 'counts': []}
+            counts, edges = np.histogram(known, bins=bins)
+            return {'edges': edges.tolist(), 'counts': counts.tolist()}
+        known = [value for value in values if not math.isnan(value)]
+        if not known:
+            return {'edges': [], 'counts': []}
+        low, high = min(known), max(known)
+        width = (high - low) / bins or 1.0
+        counts = [0] * bins
+        for value in known:
+            counts[min(int((value - low) / width), bins - 1)] += 1
+        return {'edges': [low + width * index for index in range(bins + 1)], 'counts': counts}
+
+    def group_by(self, by='client', selected=None, top=10, order='amount'):
+        # Итоги по клиентам или услугам, крупнейшие первыми: [(код, сделок, сумма, комиссионные)]
+        if by not in ('client', 'service'):
+            raise ValueError(f"Группировка возможна по client или service, а не {by}")
+        codes = self.select(by, selected)
+        amount = self.select('amount', selected)
+        commission = self.select('commission', selected)
+        if np is not None:
+            groups, inverse = np.unique(codes, return_inverse=True)
+            counts = np.bincount(inverse, minlength=len(groups))
+            amounts = np.bincount(inverse, weights=np.nan_to_num(amount), minlength=len(groups))
+            commissions = np.bincount(inverse, weights=np.nan_to_num(commission), minlength=len(groups))
+            rank = {'amount': amounts, 'count': counts, 'commission': commissions}[order]
+            chosen = np.argsort(-rank, kind='stable')[:top]
+            return [(int(groups[i]), int(counts[i]), float(amounts[i]), float(commissions[i])) for i in chosen]
+        totals = {}
+        for code, value, fee in zip(codes, amount, commission):
+            entry = totals.setdefault(code, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += 0.0 if math.isnan(value) else value
+            entry[2] += 0.0 if math.isnan(fee) else fee
+        index = {'count': 0, 'amount': 1, 'commission': 2}[order]
+        ranked = sorted(totals.items(), key=lambda item: (-item[1][index], item[0]))[:top]
+        return [(code, count, total, fee) for code, (count, total, fee) in ranked]
@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import time
+import random
+import importlib.util
+import sqlite3
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+
+from database import Database, EXCEL_MAX_ROWS
+from analytics import DealsSnapshot
+
+# Словари для правдоподобных синтетических данных
+SURNAMES = ('Иванов', 'Петров', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов', 'Лебедев', 'Козлов', 'Новиков',
+            'Морозов', 'Волков', 'Алексеев', 'Семёнов', 'Егоров', 'Павлов', 'Степанов', 'Николаев', 'Орлов')
+FIRST_NAMES = ('Роман', 'Пётр', 'Виктор', 'Анна', 'Мария', 'Елена', 'Сергей', 'Ольга', 'Андрей', 'Ирина',
+               'Дмитрий', 'Наталья', 'Алексей', 'Татьяна', 'Михаил', 'Светлана')
+COMPANIES = ('ООО «Стройресурс»', 'ИП', 'АО «Северный порт»', 'ООО «Мармелад»', 'ООО «Вектор»',
+             'ЗАО «Гарант»', 'ООО «Лесторг»', 'ТСЖ «Заречье»')
+ACTIVITIES = ('строительство', 'самозанятый', 'торговля', 'перевозки', 'консалтинг', 'общепит', 'аренда',
+              'производство', 'образование', 'медицина')
+STREETS = ('Пирогова', 'Мармеладная', 'Ленина', 'Садовая', 'Лесная', 'Набережная', 'Школьная', 'Заречная',
+           'Центральная', 'Молодёжная', 'Полевая', 'Советская')
+SERVICES = ('консультация', 'оформление договора', 'заверение копии', 'доверенность', 'завещание',
+            'наследство', 'брачный договор', 'сделка с недвижимостью', 'свидетельствование подписи',
+            'удостоверение факта')
+OUTCOMES = ('успешно', 'в работе', 'отложено', 'повторное обращение', 'требуются документы', 'завершено')
+
+
+def generate_clients(rng, count):
+    for key in range(1, count + 1):
+        if rng.random() < 0.4:
+            name = rng.choice(COMPANIES)
+        else:
+            name = f"{rng.choice(SURNAMES)} {rng.choice(FIRST_NAMES)}"
+        yield {
+            'Код_клиента': key,
+            'Название': name,
+            'Вид_деятельности': rng.choice(ACTIVITIES),
+            'Адрес': f"ул. {rng.choice(STREETS)}, д. {rng.randint(1, 150)}",
+            'Телефон': f"+79{rng.randint(0, 999999999):09d}",
+        }
+
+
+def generate_services(rng, count):
+    for key in range(1, count + 1):
+        yield {
+            'Код_услуги': key,
+            'Название': f"{SERVICES[(key - 1) % len(SERVICES)]} {key}",
+            'Описание': f"{rng.choice(SERVICES)}, {rng.choice(OUTCOMES)}",
+        }
+
+
+def generate_deals(rng, count, clients, services):
+    for key in range(1, count + 1):
+        amount = round(rng.lognormvariate(8, 1.2), 2)
+        yield {
+            'Код_сделки': key,
+            # Небольшая доля клиентов даёт основную часть сделок, как в реальной конторе
+            'Код_клиента': (min(clients, int(rng.paretovariate(1.2))) if rng.random() < 0.3
+                            else rng.randint(1, clients)),
+            'Код_услуги': rng.randint(1, services),
+            'Сумма': amount,
+            'Комиссионные': round(amount * rng.choice((0.01, 0.02, 0.05)), 2),
+            'Описание': rng.choice(OUTCOMES),
+        }
+
+
+def write_ndjson(path, records):
+    with open(path, "w", encoding="utf-8") as file:
+        for record in records:
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return path
+
+
+def reset_peak_rss():
+    # Сброс пика резидентной памяти процесса перед шагом (Linux); False, если система этого не умеет
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss():
+    # Пиковый размер резидентной памяти в байтах с последнего reset_peak_rss (VmHWM)
+    with open('/proc/self/status') as file:
+        for line in file:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) * 1024
+    return None
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Benchmark:
+    def __init__(self, workdir, clients, services, deals, seed, repeat_queries=200):
+        self.workdir = workdir
+        self.sizes = {'Клиенты': clients, 'Услуги': services, 'Сделки': deals}
+        self.seed = seed
+        self.repeat_queries = repeat_queries
+        self.results = []
+        self.memory_source = None
+
+    def measure(self, name, func, rows=None):
+        # Пик памяти — свой у каждого шага: пик RSS там, где его можно сбросить, иначе пик выделений Python
+        # по tracemalloc (он замедляет шаг, поэтому источник указан в отчёте)
+        per_step_rss = reset_peak_rss()
+        self.memory_source = 'rss' if per_step_rss else 'tracemalloc'
+        if not per_step_rss:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            result = func()
+            elapsed = time.perf_counter() - started
+            peak = peak_rss() if per_step_rss else tracemalloc.get_traced_memory()[1]
+        finally:
+            if not per_step_rss:
+                tracemalloc.stop()
+        entry = {'name': name, 'seconds': round(elapsed, 6), 'rows': rows,
+                 'rows_per_second': round(rows / elapsed, 1) if rows and elapsed else None,
+                 'peak_memory': peak}
+        self.results.append(entry)
+        print(f"{name}: {elapsed:.3f} с" + (f", {entry['rows_per_second']:.0f} строк/с" if rows else ""),
+              file=sys.stderr)
+        return result
+
+    def skip(self, name, reason):
+        self.results.append({'name': name, 'skipped': reason})
+        print(f"{name}: пропущено ({reason})", file=sys.stderr)
+
+    def run(self):
+        rng = random.Random(self.seed)
+        files = {
+            'Клиенты': write_ndjson(os.path.join(self.workdir, 'Клиенты.ndjson'),
+                                    generate_clients(rng, self.sizes['Клиенты'])),
+            'Услуги': write_ndjson(os.path.join(self.workdir, 'Услуги.ndjson'),
+                                   generate_services(rng, self.sizes['Услуги'])),
+            'Сделки': write_ndjson(os.path.join(self.workdir, 'Сделки.ndjson'),
+                                   generate_deals(rng, self.sizes['Сделки'], self.sizes['Клиенты'],
+                                                  self.sizes['Услуги'])),
+        }
+
+        with Database(os.path.join(self.workdir, 'benchmark.db')) as db:
+            for table_name, path in files.items():
+                self.measure(f"import_from_json {table_name}",
+                             lambda: db.import_from_json(table_name, path), self.sizes[table_name])
+            # Повторный импорт того же файла: все строки без изменений
+            self.measure("import_from_json Сделки (без изменений)",
+                         lambda: db.import_from_json('Сделки', files['Сделки']), self.sizes['Сделки'])
+
+            deals = self.sizes['Сделки']
+            for fmt in ('json', 'ndjson'):
+                self.measure(f"export_to_json Сделки {fmt}",
+                             lambda: db.export_to_json('Сделки', os.path.join(self.workdir, f'export.{fmt}'),
+                                                       fmt=fmt), deals)
+            self.run_excel(db, deals)
+            self.run_search(db, rng)
+            self.run_treeview(db)
+            self.run_analytics(db)
+            self.run_cascade_delete(db, rng)
+
+    def run_excel(self, db, deals):
+        if importlib.util.find_spec('openpyxl') is None:
+            self.skip("export_to_excel Сделки", "openpyxl не установлен")
+            return
+        if deals > EXCEL_MAX_ROWS:
+            self.skip("export_to_excel Сделки", "таблица не помещается на лист Excel")
+            return
+        self.measure("export_to_excel Сделки",
+                     lambda: db.export_to_excel('Сделки', os.path.join(self.workdir, 'export.xlsx')), deals)
+
+    def run_search(self, db, rng):
+        keys = [rng.randint(1, self.sizes['Сделки']) for _ in range(self.repeat_queries)]
+        self.measure("get_row Сделки", lambda: [db.get_row('Сделки', key) for key in keys], len(keys))
+        words = [rng.choice(SURNAMES + STREETS + ACTIVITIES)[:5] for _ in range(self.repeat_queries)]
+        self.measure("search Клиенты", lambda: [db.search('Клиенты', word) for word in words], len(words))
+        self.measure("report Клиенты", lambda: db.report('Клиенты'))
+
+    def run_treeview(self, db):
+        # Заполнение Treeview требует дисплея; без него замер пропускается
+        try:
+            import tkinter as tk
+            from tkinter import ttk
+            from main import PagedTreeview
+            root = tk.Tk()
+        except Exception as e:
+            self.skip("PagedTreeview Сделки", f"Tk недоступен: {e}")
+            return
+        try:
+            root.withdraw()
+            tree = ttk.Treeview(root, columns=tuple(range(6)), show='headings')
+            view = PagedTreeview(tree, db, 'Сделки')
+            self.measure("PagedTreeview.reload Сделки", view.reload, view.page_size)
+            pages = min(50, self.sizes['Сделки'] // view.page_size)
+            self.measure("PagedTreeview.load_next Сделки", lambda: [view.load_next() for _ in range(pages)],
+                         pages * view.page_size)
+        finally:
+            root.destroy()
+
+    def run_analytics(self, db):
+        deals = self.sizes['Сделки']
+        snapshot = self.measure("DealsSnapshot.load", lambda: DealsSnapshot(db).load(), deals)
+        self.measure("DealsSnapshot запросы", lambda: (snapshot.summary(snapshot.mask(service=1, amount=(100, None))),
+                                                       snapshot.percentiles(), snapshot.group_by('client'),
+                                                       snapshot.histogram()), deals)
+
+    def run_cascade_delete(self, db, rng):
+        clients = [rng.randint(1, self.sizes['Клиенты']) for _ in range(min(100, self.sizes['Клиенты']))]
+        self.measure("delete_row Клиенты (каскад)", lambda: [db.delete_row('Клиенты', key) for key in clients],
+                     len(clients))
+
+    def report(self):
+        return {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': self.seed,
+            'sizes': self.sizes,
+            'memory_source': self.memory_source,
+            'results': self.results,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности Database и App на синтетических данных")
+    parser.add_argument('--deals', type=int, default=10000, help="число сделок (по умолчанию %(default)s)")
+    parser.add_argument('--clients', type=int, help="число клиентов (по умолчанию сделок / 20)")
+    parser.add_argument('--services', type=int, default=200, help="число услуг (по умолчанию %(default)s)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workdir', help="каталог для базы и файлов (по умолчанию временный)")
+    parser.add_argument('-o', '--output', help="файл для результатов в JSON (по умолчанию stdout)")
+    args = parser.parse_args(argv)
+    clients = args.clients or max(1, args.deals // 20)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        benchmark = Benchmark(workdir, clients, args.services, args.deals, args.seed)
+        benchmark.run()
+
+    report = json.dumps(benchmark.report(), ensure_ascii=False, indent=4)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(report)
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+import os
+import sys
+import json
+import sqlite3
+import argparse
+
+from database import Database, COLUMNS
+
+# Формат xlsx подгружает openpyxl только при его выборе
+FORMATS = ('json', 'compact', 'ndjson', 'xlsx')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m cli',
+                                     description="Пакетный импорт и экспорт данных нотариальной конторы "
+                                                 "без графического интерфейса")
+    parser.add_argument('--db', default='notary_office.db', help="файл базы данных (по умолчанию %(default)s)")
+    parser.add_argument('-q', '--quiet', action='store_true', help="не выводить прогресс")
+    parser.add_argument('--slow-query-log', help="журнал запросов дольше --slow-query-ms")
+    parser.add_argument('--slow-query-ms', type=float, default=100.0)
+    parser.add_argument('--stats', help="сохранить замеры запросов в JSON-файл")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help="выгрузить таблицу в файл")
+    export.add_argument('table', choices=COLUMNS)
+    export.add_argument('--format', choices=FORMATS, default='json')
+    export.add_argument('--gzip', action='store_true', help="сжать JSON/NDJSON")
+    export.add_argument('-o', '--output', help="путь к файлу (по умолчанию <таблица>.<формат>)")
+
+    export_all = commands.add_parser('export-all', help="выгрузить все таблицы из одного снимка базы")
+    export_all.add_argument('--format', choices=FORMATS, default='ndjson')
+    export_all.add_argument('--gzip', action='store_true', help="сжать JSON/NDJSON")
+    export_all.add_argument('--workers', type=int, help="число процессов (по умолчанию по одному на таблицу)")
+    export_all.add_argument('-o', '--output', help="каталог для JSON/NDJSON или файл книги xlsx "
+                                                   "(по умолчанию текущий каталог и notary_office.xlsx)")
+
+    backup = commands.add_parser('backup', help="резервная копия базы без остановки работы")
+    backup.add_argument('file', nargs='?', help="файл копии (по умолчанию копия с отметкой времени в --dir)")
+    backup.add_argument('--dir', default='backups', help="каталог копий (по умолчанию %(default)s)")
+    backup.add_argument('--keep', type=int, default=24, help="сколько копий хранить в --dir")
+
+    restore = commands.add_parser('restore', help="заменить базу резервной копией")
+    restore.add_argument('file')
+
+    changes = commands.add_parser('changes', help="выгрузить в NDJSON изменения таблицы после отметки")
+    changes.add_argument('table', choices=COLUMNS)
+    since = changes.add_mutually_exclusive_group()
+    since.add_argument('--since', type=int, default=0, help="номер последнего выгруженного изменения")
+    since.add_argument('--state', help="файл с отметкой: читается перед выгрузкой и обновляется после неё")
+    changes.add_argument('--gzip', action='store_true')
+    changes.add_argument('-o', '--output', help="путь к файлу (по умолчанию <таблица>.changes.ndjson)")
+
+    compact = commands.add_parser('compact-changes', help="сжать журнал изменений")
+    compact.add_argument('--before', type=int, help="удалить также все записи с номером не больше этого")
+
+    analyze = commands.add_parser('analytics', help="сводка, перцентили и крупнейшие клиенты/услуги по сделкам")
+    analyze.add_argument('--client', type=int, help="только сделки клиента")
+    analyze.add_argument('--service', type=int, help="только сделки по услуге")
+    analyze.add_argument('--min-amount', type=float)
+    analyze.add_argument('--max-amount', type=float)
+    analyze.add_argument('--group-by', choices=('client', 'service'), default='client')
+    analyze.add_argument('--top', type=int, default=10)
+    analyze.add_argument('--percentiles', default='5,25,50,75,95', help="через запятую")
+    analyze.add_argument('--bins', type=int, default=20, help="корзин гистограммы сумм")
+
+    load = commands.add_parser('import', help="загрузить таблицу из JSON, NDJSON (в т.ч. .gz) или xlsx")
+    load.add_argument('table', choices=COLUMNS)
+    load.add_argument('file')
+    load.add_argument('--batch-size', type=int, default=1000)
+    load.add_argument('--commit-every', type=int, default=50000)
+    return parser
+
+
+def report(*progress):
+    # Прогресс выводится в stderr, чтобы stdout оставался пригодным для конвейеров
+    if len(progress) > 1:
+        print(f"\r{progress[0]} строк ({progress[1]:.0f} строк/с)", end='', file=sys.stderr)
+    else:
+        print(f"\r{progress[0]} строк", end='', file=sys.stderr)
+
+
+def analyze_deals(db, args):
+    # analytics тянет NumPy, импорт которого заметно замедляет запуск остальных команд
+    from analytics import DealsSnapshot
+
+    snapshot = DealsSnapshot(db).load()
+    amount = None if args.min_amount is None and args.max_amount is None else (args.min_amount, args.max_amount)
+    selected = snapshot.mask(client=args.client, service=args.service, amount=amount)
+    return {
+        'summary': snapshot.summary(selected),
+        'percentiles': snapshot.percentiles(q=[float(p) for p in args.percentiles.split(',')], selected=selected),
+        'histogram': snapshot.histogram(bins=args.bins, selected=selected),
+        'top': [dict(zip(('key', 'count', 'amount', 'commission'), group))
+                for group in snapshot.group_by(args.group_by, selected, args.top)],
+    }
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    progress = None if args.quiet else report
+    if args.command in ('export', 'export-all') and args.format == 'xlsx' and args.gzip:
+        parser.error("--gzip применим только к JSON и NDJSON")
+
+    try:
+        with Database(args.db, slow_query_threshold=args.slow_query_ms / 1000,
+                      slow_query_log=args.slow_query_log) as db:
+            if args.command == 'export':
+                if args.format == 'xlsx':
+                    result = db.export_to_excel(args.table, args.output, progress=progress)
+                else:
+                    result = db.export_to_json(args.table, args.output, fmt=args.format, compress=args.gzip,
+                                               progress=progress)
+            elif args.command == 'export-all':
+                if args.format == 'xlsx':
+                    result = db.export_all_to_excel(args.output or 'notary_office.xlsx', progress=progress)
+                else:
+                    files = db.export_all(args.output or '.', fmt=args.format, compress=args.gzip,
+                                          max_workers=args.workers, progress=progress)
+                    result = json.dumps(files, ensure_ascii=False)
+            elif args.command == 'backup':
+                pages = None if args.quiet else lambda copied, total: print(f"\r{copied} из {total} страниц",
+                                                                            end='', file=sys.stderr)
+                if args.file:
+                    result = db.backup(args.file, progress=pages)
+                else:
+                    result = db.rotate_backup(args.dir, args.keep, progress=pages)
+            elif args.command == 'changes':
+                since = args.since
+                if args.state and os.path.exists(args.state):
+                    with open(args.state, encoding="utf-8") as file:
+                        since = int(file.read().strip() or 0)
+                stats = db.export_changes(args.table, since, args.output, compress=args.gzip, progress=progress)
+                if args.state:
+                    with open(args.state, "w", encoding="utf-8") as file:
+                        file.write(f"{stats['watermark']}\n")
+                result = json.dumps(stats, ensure_ascii=False)
+            elif args.command == 'compact-changes':
+                result = json.dumps({'removed': db.compact_changes(args.before)})
+            elif args.command == 'analytics':
+                result = json.dumps(analyze_deals(db, args), ensure_ascii=False)
+            elif args.command == 'restore':
+                result = db.restore(args.file)
+            elif args.file.endswith('.xlsx'):
+                stats = db.import_from_excel(args.table, args.file, batch_size=args.batch_size,
+                                             commit_every=args.commit_every, progress=progress)
+                result = json.dumps(stats, ensure_ascii=False)
+            else:
+                stats = db.import_from_json(args.table, args.file, batch_size=args.batch_size,
+                                            commit_every=args.commit_every, progress=progress)
+                result = json.dumps(stats, ensure_ascii=False)
+            if args.stats:
+                db.stats.dump(args.stats)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        if progress is not None:
+            print(file=sys.stderr)
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+
+    if progress is not None:
+        print(file=sys.stderr)
+    print(result)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1437 @@
+import os
+import re
+import sys
+import json
+import gzip
+import time
+import shutil
+import sqlite3
+import logging
+import tempfile
+import threading
+from datetime import datetime
+from itertools import islice
+from collections import deque, OrderedDict
+from contextlib import contextmanager, nullcontext
+
+# Первичные ключи таблиц, по которым идёт постраничная выборка
+PRIMARY_KEYS = {
+    'Клиенты': 'Код_клиента',
+    'Услуги': 'Код_услуги',
+    'Сделки': 'Код_сделки',
+}
+
+# Столбцы таблиц в порядке схемы
+COLUMNS = {
+    'Клиенты': ('Код_клиента', 'Название', 'Вид_деятельности', 'Адрес', 'Телефон'),
+    'Услуги': ('Код_услуги', 'Название', 'Описание'),
+    'Сделки': ('Код_сделки', 'Код_клиента', 'Код_услуги', 'Сумма', 'Комиссионные', 'Описание'),
+}
+
+# Лист Excel вмещает не более 1 048 576 строк вместе с заголовком; openpyxl это не проверяет
+EXCEL_MAX_ROWS = 1048575
+
+# Зависимые таблицы, строки которых удаляются через ON DELETE CASCADE
+CASCADES = {
+    'Клиенты': (('Сделки', 'Код_клиента'),),
+    'Услуги': (('Сделки', 'Код_услуги'),),
+}
+
+# Столбцы, по которым работает полнотекстовый поиск (FTS5)
+SEARCH_COLUMNS = {
+    'Клиенты': ('Название', 'Вид_деятельности', 'Адрес', 'Телефон'),
+    'Услуги': ('Название', 'Описание'),
+    'Сделки': ('Описание',),
+}
+
+
+def search_index_statements(table_name):
+    # FTS5-индекс с внешним содержимым (текст хранится только в самой таблице)
+    # и триггеры, поддерживающие его в актуальном состоянии
+    fts = f"{table_name}_поиск"
+    key = PRIMARY_KEYS[table_name]
+    columns = SEARCH_COLUMNS[table_name]
+    names = ', '.join(columns)
+    new_values = ', '.join(f"new.{column}" for column in columns)
+    old_values = ', '.join(f"old.{column}" for column in columns)
+    return (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table_name}', content_rowid='{key}')",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table_name} BEGIN
+            INSERT INTO {fts} (rowid, {names}) VALUES (new.{key}, {new_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table_name} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.{key}, {old_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {names} ON {table_name} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.{key}, {old_values});
+            INSERT INTO {fts} (rowid, {names}) VALUES (new.{key}, {new_values});
+        END""",
+        # Индексация уже существующих строк
+        f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')",
+    )
+
+
+def search_query(text):
+    # Каждое слово запроса ищется как префикс: "пирог" найдёт "пирогова"
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+
+# Итоговые таблицы по сделкам: (таблица итогов, столбец группировки в Сделки)
+SUMMARIES = {
+    'Клиенты': ('Итоги_клиентов', 'Код_клиента'),
+    'Услуги': ('Итоги_услуг', 'Код_услуги'),
+}
+
+
+def numeric(column):
+    # Значение столбца REAL для итогов: пустая строка из формы и прочий текст хранятся как есть, в итогах это 0
+    return f"CASE WHEN typeof({column}) IN ('integer', 'real') THEN {column} ELSE 0 END"
+
+
+def summary_statements():
+    # Итоги по клиентам, услугам и общий итог поддерживаются триггерами на Сделки,
+    # поэтому отчёт читает готовые строки вместо агрегации всех сделок
+    statements = [
+        '''
+            CREATE TABLE IF NOT EXISTS Итоги_общие (
+                Код INTEGER PRIMARY KEY CHECK (Код = 1),
+                Количество INTEGER NOT NULL,
+                Сумма REAL NOT NULL,
+                Комиссионные REAL NOT NULL
+            )
+        ''',
+    ]
+    for summary, column in SUMMARIES.values():
+        statements += [
+            f'''
+            CREATE TABLE IF NOT EXISTS {summary} (
+                {column} INTEGER PRIMARY KEY,
+                Количество INTEGER NOT NULL,
+                Сумма REAL NOT NULL,
+                Комиссионные REAL NOT NULL
+            )
+            ''',
+            f"CREATE INDEX IF NOT EXISTS {summary}_Сумма ON {summary} (Сумма)",
+        ]
+    return (*statements, *summary_fill_statements(), *summary_trigger_statements())
+
+
+def summary_fill_statements():
+    # Итоги по уже существующим сделкам (пустые итоговые таблицы)
+    amount, commission = numeric('Сумма'), numeric('Комиссионные')
+    statements = [f"INSERT OR IGNORE INTO Итоги_общие SELECT 1, COUNT(*), TOTAL({amount}), TOTAL({commission}) "
+                  f"FROM Сделки"]
+    for summary, column in SUMMARIES.values():
+        statements.append(f"INSERT OR IGNORE INTO {summary} SELECT {column}, COUNT(*), TOTAL({amount}), "
+                          f"TOTAL({commission}) FROM Сделки WHERE {column} IS NOT NULL GROUP BY {column}")
+    return statements
+
+
+def summary_trigger_statements():
+    new_amount, new_commission = numeric('new.Сумма'), numeric('new.Комиссионные')
+    old_amount, old_commission = numeric('old.Сумма'), numeric('old.Комиссионные')
+    add, subtract = [], []
+    for summary, column in SUMMARIES.values():
+        add.append(f"""
+            INSERT INTO {summary} ({column}, Количество, Сумма, Комиссионные)
+            SELECT new.{column}, 1, {new_amount}, {new_commission} WHERE new.{column} IS NOT NULL
+            ON CONFLICT ({column}) DO UPDATE SET Количество = Количество + 1,
+                Сумма = Сумма + excluded.Сумма, Комиссионные = Комиссионные + excluded.Комиссионные;""")
+        subtract.append(f"""
+            UPDATE {summary} SET Количество = Количество - 1, Сумма = Сумма - {old_amount},
+                Комиссионные = Комиссионные - {old_commission}
+            WHERE {column} = old.{column};
+            DELETE FROM {summary} WHERE {column} = old.{column} AND Количество = 0;""")
+    add.append(f"""
+            UPDATE Итоги_общие SET Количество = Количество + 1, Сумма = Сумма + {new_amount},
+                Комиссионные = Комиссионные + {new_commission};""")
+    subtract.append(f"""
+            UPDATE Итоги_общие SET Количество = Количество - 1, Сумма = Сумма - {old_amount},
+                Комиссионные = Комиссионные - {old_commission};""")
+    return (
+        f"CREATE TRIGGER IF NOT EXISTS Сделки_итоги_ai AFTER INSERT ON Сделки BEGIN{''.join(add)}\n        END",
+        f"CREATE TRIGGER IF NOT EXISTS Сделки_итоги_ad AFTER DELETE ON Сделки BEGIN{''.join(subtract)}\n        END",
+        f"CREATE TRIGGER IF NOT EXISTS Сделки_итоги_au AFTER UPDATE OF Код_клиента, Код_услуги, Сумма, Комиссионные "
+        f"ON Сделки BEGIN{''.join(subtract)}{''.join(add)}\n        END",
+    )
+
+
+def summary_delta_statements(before, after, changes):
+    # Итоги после массовой загрузки сделок: вклад прежних значений изменённых строк вычитается,
+    # новых — прибавляется, одним запросом на итоговую таблицу вместо триггера на каждую строку
+    amount, commission = numeric('Сумма'), numeric('Комиссионные')
+    delta = (f"SELECT -1 AS Знак, d.* FROM {before} d JOIN {changes} i ON i.Ключ = d.Код_сделки "
+             f"UNION ALL SELECT 1, p.* FROM {after} p JOIN {changes} i ON i.Ключ = p.Код_сделки")
+    statements = [f"UPDATE Итоги_общие SET (Количество, Сумма, Комиссионные) = (SELECT Итоги_общие.Количество + "
+                  f"IFNULL(SUM(Знак), 0), Итоги_общие.Сумма + TOTAL(Знак * {amount}), "
+                  f"Итоги_общие.Комиссионные + TOTAL(Знак * {commission}) FROM ({delta}))"]
+    for summary, column in SUMMARIES.values():
+        statements += [
+            f"INSERT INTO {summary} ({column}, Количество, Сумма, Комиссионные) "
+            f"SELECT {column}, SUM(Знак), TOTAL(Знак * {amount}), TOTAL(Знак * {commission}) FROM ({delta}) "
+            f"WHERE {column} IS NOT NULL GROUP BY {column} "
+            f"ON CONFLICT ({column}) DO UPDATE SET Количество = Количество + excluded.Количество, "
+            f"Сумма = Сумма + excluded.Сумма, Комиссионные = Комиссионные + excluded.Комиссионные",
+            f"DELETE FROM {summary} WHERE Количество = 0",
+        ]
+    return statements
+
+
+def bulk_triggers(table_name):
+    # Триггеры на вставку и изменение строк, которые массовая загрузка заменяет обработкой всей порции
+    names = [f"{table_name}_поиск", f"{table_name}_поколение", f"{table_name}_журнал"]
+    if table_name == 'Сделки':
+        names.append('Сделки_итоги')
+    return tuple(f"{name}_{suffix}" for name in names for suffix in ('ai', 'au'))
+
+
+def generation_statements():
+    # Счётчик изменений каждой таблицы для кэша результатов. Триггеры срабатывают и на каскадное
+    # удаление, и на записи других соединений и процессов
+    statements = ["CREATE TABLE IF NOT EXISTS Поколения (Таблица TEXT PRIMARY KEY, Номер INTEGER NOT NULL) "
+                  "WITHOUT ROWID"]
+    for table_name in PRIMARY_KEYS:
+        statements.append(f"INSERT OR IGNORE INTO Поколения VALUES ('{table_name}', 0)")
+        for suffix, event in (('ai', 'INSERT'), ('ad', 'DELETE'), ('au', 'UPDATE')):
+            statements.append(f"CREATE TRIGGER IF NOT EXISTS {table_name}_поколение_{suffix} AFTER {event} "
+                              f"ON {table_name} BEGIN UPDATE Поколения SET Номер = Номер + 1 "
+                              f"WHERE Таблица = '{table_name}'; END")
+    return tuple(statements)
+
+
+def change_log_statements():
+    # Журнал изменений для инкрементальной выгрузки. AUTOINCREMENT: номера не переиспользуются
+    # даже после сжатия журнала, поэтому отметка последней выгрузки остаётся верной
+    statements = [
+        '''
+            CREATE TABLE IF NOT EXISTS Журнал_изменений (
+                Номер INTEGER PRIMARY KEY AUTOINCREMENT,
+                Таблица TEXT NOT NULL,
+                Операция TEXT NOT NULL CHECK (Операция IN ('I', 'U', 'D')),
+                Ключ INTEGER NOT NULL,
+                Время TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+            )
+        ''',
+        "CREATE INDEX IF NOT EXISTS Журнал_изменений_Таблица ON Журнал_изменений (Таблица, Номер, Ключ)",
+    ]
+    log = "INSERT INTO Журнал_изменений (Таблица, Операция, Ключ)"
+    for table_name, key in PRIMARY_KEYS.items():
+        statements += [
+            f"CREATE TRIGGER IF NOT EXISTS {table_name}_журнал_ai AFTER INSERT ON {table_name} "
+            f"BEGIN {log} VALUES ('{table_name}', 'I', new.{key}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {table_name}_журнал_ad AFTER DELETE ON {table_name} "
+            f"BEGIN {log} VALUES ('{table_name}', 'D', old.{key}); END",
+            # Смена первичного ключа — удаление старого ключа и изменение нового
+            f"CREATE TRIGGER IF NOT EXISTS {table_name}_журнал_au AFTER UPDATE ON {table_name} "
+            f"BEGIN {log} SELECT '{table_name}', 'D', old.{key} WHERE old.{key} IS NOT new.{key}; "
+            f"{log} VALUES ('{table_name}', 'U', new.{key}); END",
+        ]
+    return tuple(statements)
+
+
+# Миграции схемы: элемент i переводит базу с версии i на версию i + 1
+MIGRATIONS = [
+    # 1: исходные таблицы (IF NOT EXISTS — базы, созданные до версионирования, уже их содержат)
+    (
+        '''
+            CREATE TABLE IF NOT EXISTS Клиенты (
+                Код_клиента INTEGER PRIMARY KEY,
+                Название TEXT,
+                Вид_деятельности TEXT,
+                Адрес TEXT,
+                Телефон TEXT
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS Услуги (
+                Код_услуги INTEGER PRIMARY KEY,
+                Название TEXT,
+                Описание TEXT
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS Сделки (
+                Код_сделки INTEGER PRIMARY KEY,
+                Код_клиента INTEGER,
+                Код_услуги INTEGER,
+                Сумма REAL,
+                Комиссионные REAL,
+                Описание TEXT,
+                FOREIGN KEY (Код_клиента) REFERENCES Клиенты (Код_клиента) ON DELETE CASCADE,
+                FOREIGN KEY (Код_услуги) REFERENCES Услуги (Код_услуги) ON DELETE CASCADE
+            )
+        ''',
+    ),
+    # 2: индексы на внешние ключи Сделки — каскадное удаление и выборка по клиенту/услуге без полного сканирования
+    (
+        "CREATE INDEX IF NOT EXISTS Сделки_Код_клиента ON Сделки (Код_клиента)",
+        "CREATE INDEX IF NOT EXISTS Сделки_Код_услуги ON Сделки (Код_услуги)",
+    ),
+    # 3: полнотекстовый поиск по названиям, описаниям, адресам, видам деятельности и телефонам
+    (
+        *search_index_statements('Клиенты'),
+        *search_index_statements('Услуги'),
+        *search_index_statements('Сделки'),
+    ),
+    # 4: итоги по клиентам и услугам для отчётов
+    summary_statements(),
+    # 5: поколения таблиц для кэша результатов запросов
+    generation_statements(),
+    # 6: журнал изменений
+    change_log_statements(),
+    # 7: сортировка сделок по сумме и комиссионным без временного B-дерева
+    (
+        "CREATE INDEX IF NOT EXISTS Сделки_Сумма ON Сделки (Сумма)",
+        "CREATE INDEX IF NOT EXISTS Сделки_Комиссионные ON Сделки (Комиссионные)",
+    ),
+    # 8: текст в Сумма и Комиссионные (пустое поле формы) попадал в итоги как есть — триггеры
+    # пересоздаются со счётом такого значения за 0, итоги пересчитываются
+    (
+        *(f"DROP TRIGGER IF EXISTS Сделки_итоги_{suffix}" for suffix in ('ai', 'ad', 'au')),
+        *summary_trigger_statements(),
+        *(f"DELETE FROM {summary}" for summary in ('Итоги_общие', *(summary for summary, _ in SUMMARIES.values()))),
+        *summary_fill_statements(),
+    ),
+]
+
+# Пробелы между лексемами JSON-массива и строками NDJSON
+WHITESPACE = re.compile(r'\s*')
+
+
+def iter_json_records(file, chunk_size=64 * 1024):
+    # Потоковый разбор JSON-массива объектов или NDJSON: в памяти только текущий кусок файла.
+    # Разделители проверяются так же строго, как в json.load: массив открывается и закрывается один раз,
+    # между записями ровно одна запятая, после массива только пробелы; в NDJSON запись начинается с новой строки
+    decoder = json.JSONDecoder()
+    buffer, pos, eof, more = '', 0, False, False
+    # start — начало файла; массив: first, record (после запятой), after (после записи), end; NDJSON: lines
+    state, newline, seen = 'start', False, False
+    while True:
+        if (more or pos == len(buffer)) and not eof:
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer, pos, more = buffer[pos:] + chunk, 0, False
+        end = WHITESPACE.match(buffer, pos).end()
+        newline = newline or '\n' in buffer[pos:end]
+        pos = end
+        if pos == len(buffer) and not eof:
+            continue
+        char = buffer[pos:pos + 1]  # '' — конец файла
+        if state == 'start':
+            state = 'first' if char == '[' else 'lines'
+            pos += char == '['
+            continue
+        if state == 'after':
+            if char not in (',', ']'):
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+            state = 'record' if char == ',' else 'end'
+            pos += 1
+            continue
+        if state == 'first' and char == ']':
+            state = 'end'
+            pos += 1
+            continue
+        if state == 'end' or (state == 'lines' and seen and char and not newline):
+            if char:
+                raise json.JSONDecodeError("Extra data", buffer, pos)
+            return
+        if not char:
+            if state == 'lines':
+                return
+            # Массив обрезан: нет записи или закрывающей скобки
+            raise json.JSONDecodeError("Expecting value", buffer, pos)
+        try:
+            record, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # Запись обрезана концом куска — дочитываем файл
+            if eof:
+                raise
+            more = True
+            continue
+        if not isinstance(record, dict):
+            raise ValueError("Ожидался JSON-объект для каждой строки таблицы")
+        yield record
+        newline, seen = False, True
+        if state != 'lines':
+            state = 'after'
+
+
+class BackupRestarted(Exception):
+    pass
+
+
+@contextmanager
+def replacing(file_path):
+    # Файл пишется рядом под временным именем и подменяет file_path только целиком:
+    # ошибка или отмена не оставляют обрезанный файл и не трогают прежнюю версию
+    fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(os.path.abspath(file_path)))
+    os.close(fd)
+    try:
+        yield tmp
+        os.replace(tmp, file_path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def json_file_name(table_name, fmt='json', compress=False):
+    return f"{table_name}.{'ndjson' if fmt == 'ndjson' else 'json'}" + (".gz" if compress else "")
+
+
+def changes_file_name(table_name, compress=False):
+    return f"{table_name}.changes.ndjson" + (".gz" if compress else "")
+
+
+def as_key(value):
+    # Ключ из JSON/формы может прийти строкой — приводим к числу, как это сделает SQLite
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class QueryStats:
+    # Замеры всех запросов: время выполнения и выборки, число строк, место вызова.
+    # Запросы дольше порога попадают в журнал медленных запросов
+    def __init__(self, slow_threshold=0.1, log_file=None, explain=False, keep_slow=100):
+        self.slow_threshold = slow_threshold
+        self.explain = explain
+        self.lock = threading.Lock()
+        self.entries = {}  # (вид, текст) -> агрегированные замеры
+        self.slow = deque(maxlen=keep_slow)
+        self.logger = logging.getLogger('notary_office.slow_queries')
+        if log_file is not None and not any(getattr(handler, 'baseFilename', None) == os.path.abspath(log_file)
+                                            for handler in self.logger.handlers):
+            handler = logging.FileHandler(log_file, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+
+    def record(self, kind, text, seconds, rows=0, site=None, calls=1):
+        with self.lock:
+            entry = self.entries.get((kind, text))
+            if entry is None:
+                entry = self.entries[(kind, text)] = {'kind': kind, 'text': text, 'calls': 0, 'seconds': 0.0,
+                                                      'max_seconds': 0.0, 'rows': 0, 'site': site}
+            entry['calls'] += calls
+            entry['seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+            entry['rows'] += rows
+            if site is not None:
+                entry['site'] = site
+
+    def record_slow(self, text, seconds, rows, site, plan=None):
+        event = {'time': time.time(), 'text': text, 'seconds': seconds, 'rows': rows, 'site': site, 'plan': plan}
+        with self.lock:
+            self.slow.append(event)
+        self.logger.info("%.1f мс, строк: %d, %s: %s%s", seconds * 1000, rows, site, text,
+                         "".join(f"\n    {step}" for step in plan or ()))
+
+    @contextmanager
+    def span(self, name):
+        # Замер участка вне SQLite (заполнение Treeview, сохранение книги openpyxl и т.п.)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record('span', name, time.perf_counter() - started, site=call_site())
+
+    def snapshot(self):
+        # Сводка, самые затратные запросы первыми
+        with self.lock:
+            entries = [dict(entry) for entry in self.entries.values()]
+            slow = list(self.slow)
+        entries.sort(key=lambda entry: entry['seconds'], reverse=True)
+        return {'entries': entries, 'slow': slow}
+
+    def dump(self, file_path):
+        with open(file_path, "w", encoding="utf-8") as file:
+            json.dump(self.snapshot(), file, ensure_ascii=False, indent=4)
+        return file_path
+
+    def reset(self):
+        with self.lock:
+            self.entries.clear()
+            self.slow.clear()
+
+
+def call_site():
+    # Ближайший вызов из этого модуля и первый вызов за его пределами: "database.py:120 fetch_page <- main.py:80 ..."
+    frame = sys._getframe(1)
+    inner = None
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename == __file__:
+            if inner is None and code.co_name not in INSTRUMENTATION_FRAMES:
+                inner = f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}"
+        elif code.co_filename != CONTEXTLIB_FILE:
+            outer = f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}"
+            return f"{inner} <- {outer}" if inner else outer
+        frame = frame.f_back
+    return inner
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    # Курсор, замеряющий execute/executemany и последующие fetch* одного запроса
+    def execute(self, sql, parameters=()):
+        self.start(sql, parameters)
+        started = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        finally:
+            self.measured(time.perf_counter() - started, max(self.rowcount, 0), calls=1)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self.start(sql, None)
+        started = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        finally:
+            self.measured(time.perf_counter() - started, max(self.rowcount, 0), calls=1)
+        return self
+
+    def start(self, sql, parameters):
+        self.sql = ' '.join(sql.split())
+        self.parameters = parameters
+        self.site = call_site()
+        self.elapsed = 0.0
+        self.fetched = 0
+        self.reported = False
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self.measured(time.perf_counter() - started, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self.measured(time.perf_counter() - started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self.measured(time.perf_counter() - started, len(rows))
+        return rows
+
+    def measured(self, seconds, rows, calls=0):
+        stats = self.connection.stats
+        if stats is None or getattr(self, 'sql', None) is None:
+            return
+        stats.record('sql', self.sql, seconds, rows, self.site, calls)
+        self.elapsed += seconds
+        self.fetched += rows
+        # Запрос учитывается как медленный один раз, когда суммарное время превысило порог
+        if not self.reported and self.elapsed >= stats.slow_threshold:
+            self.reported = True
+            plan = self.connection.query_plan(self.sql, self.parameters) if stats.explain else None
+            stats.record_slow(self.sql, self.elapsed, self.fetched, self.site, plan)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # Все запросы соединения, в том числе conn.execute(...), идут через InstrumentedCursor
+    stats = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def query_plan(self, sql, parameters):
+        # EXPLAIN QUERY PLAN только для чтения; запрос выполняется мимо замеров
+        if parameters is None or not sql.upper().startswith(('SELECT', 'WITH')):
+            return None
+        try:
+            cursor = super().cursor()
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)
+            return [row[-1] for row in cursor.fetchall()]
+        except sqlite3.Error:
+            return None
+
+
+def result_size(key, rows):
+    # Приблизительный объём выборки в памяти: список, кортежи строк и значения
+    size = sys.getsizeof(rows) + sys.getsizeof(key[0])
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return size
+
+
+class QueryCache:
+    # Результаты чтения с вытеснением давно не использованных (LRU) в пределах бюджета в байтах.
+    # Запись хранит поколения своих таблиц и устаревает, как только любое из них сменится
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (запрос, параметры) -> (поколения, строки, размер)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, generations):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != generations:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, key, generations, rows):
+        size = result_size(key, rows)
+        # Крупная выборка не должна вытеснять весь кэш
+        if size > self.max_bytes // 4:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[2]
+            self.entries[key] = (generations, tuple(rows), size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, _, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+
+    def info(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.size, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+class FairLock:
+    # Блокировка, которая достаётся потокам в порядке очереди. SQLite ждёт занятую базу опросом, поэтому импорт,
+    # сразу открывающий следующую транзакцию, без очереди не пропускал бы запись из потока Tk до своего конца
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.issued = 0
+        self.serving = 0
+
+    def __enter__(self):
+        with self.condition:
+            ticket = self.issued
+            self.issued += 1
+            self.condition.wait_for(lambda: self.serving == ticket)
+
+    def __exit__(self, *exc_info):
+        with self.condition:
+            self.serving += 1
+            self.condition.notify_all()
+
+
+# Служебные кадры, которые call_site пропускает
+INSTRUMENTATION_FRAMES = {'execute', 'executemany', 'start', 'fetchone', 'fetchmany', 'fetchall', 'measured',
+                          'span', 'call_site'}
+CONTEXTLIB_FILE = contextmanager.__code__.co_filename
+
+
+class Database:
+    def __init__(self, db_name='notary_office.db', synchronous='NORMAL', cache_size=-16000,
+                 mmap_size=64 * 1024 * 1024, cached_statements=256, slow_query_threshold=0.1, slow_query_log=None,
+                 explain_slow_queries=False, result_cache_bytes=16 * 1024 * 1024):
+        self.db_name = db_name
+        self.stats = QueryStats(slow_query_threshold, slow_query_log, explain_slow_queries)
+        # result_cache_bytes=0 отключает кэш результатов
+        self.cache = QueryCache(result_cache_bytes) if result_cache_bytes else None
+        # cache_size < 0 задаёт размер кэша страниц в КиБ
+        self.pragmas = {'synchronous': synchronous, 'cache_size': cache_size, 'mmap_size': mmap_size}
+        self.cached_statements = cached_statements
+        self.local = threading.local()
+        self.connections = []  # по одному соединению на поток, закрываются в close()
+        self.lock = threading.Lock()
+        self.writers = FairLock()  # очередь потоков этого процесса на запись
+        self.setup_database()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def connect_db(self):
+        # Соединение открывается один раз на поток и дальше переиспользуется
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            # Под блокировкой: restore не должен подменить файл между открытием и регистрацией соединения.
+            # isolation_level=None: транзакции открываются явно в transaction()
+            with self.lock:
+                conn = sqlite3.connect(self.db_name, isolation_level=None, check_same_thread=False,
+                                       cached_statements=self.cached_statements, factory=InstrumentedConnection)
+                self.connections.append(conn)
+            conn.stats = self.stats
+            conn.execute("PRAGMA foreign_keys = ON")  # Включение поддержки внешних ключей
+            conn.execute("PRAGMA journal_mode = WAL")
+            for name, value in self.pragmas.items():
+                conn.execute(f"PRAGMA {name} = {value}")
+            self.local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        # Вложенные вызовы работают через SAVEPOINT внутри внешней транзакции;
+        # immediate сразу берёт блокировку на запись. Все записи открываются так: в режиме WAL транзакция,
+        # начатая чтением, не дожидается блокировки (busy timeout не действует), а сразу получает
+        # "database is locked", если другое соединение успело зафиксировать изменения
+        conn = self.connect_db()
+        if conn.in_transaction:
+            conn.execute("SAVEPOINT nested")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK TO nested")
+                conn.execute("RELEASE nested")
+                raise
+            conn.execute("RELEASE nested")
+            return
+        with self.writers if immediate else nullcontext():
+            if immediate:
+                self.begin_immediate(conn)
+            else:
+                conn.execute("BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def begin_immediate(self, conn, timeout=5.0, poll=0.001):
+        # Блокировка на запись ожидается частым опросом: обработчик занятости SQLite опрашивает базу
+        # раз в 100 мс и не попадает в паузу между порциями импорта, идущего в другом процессе
+        conn.execute("PRAGMA busy_timeout = 0")
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    return
+                except sqlite3.OperationalError as e:
+                    if 'locked' not in str(e) or time.monotonic() > deadline:
+                        raise
+                    time.sleep(poll)
+        finally:
+            conn.execute(f"PRAGMA busy_timeout = {int(timeout * 1000)}")
+
+    def close(self):
+        with self.lock:
+            self.close_connections()
+
+    def close_connections(self):
+        # Вызывается под self.lock; потоки откроют новые соединения при следующем обращении
+        for conn in self.connections:
+            # Перед закрытием SQLite обновляет статистику там, где она устарела
+            conn.execute("PRAGMA optimize")
+            conn.close()
+        self.connections.clear()
+        self.local = threading.local()
+
+    def setup_database(self):
+        # Обновление схемы до последней версии; номер версии хранится в PRAGMA user_version
+        conn = self.connect_db()
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRATIONS):
+            return
+        with self.transaction(immediate=True):
+            # Перечитываем версию под блокировкой: базу мог обновить другой процесс
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {number}")
+        # Свежая статистика для планировщика после изменения схемы
+        conn.execute("ANALYZE")
+
+    def generations(self, conn, tables):
+        # Поколения перечитываются, только если базу изменило это соединение (total_changes)
+        # или любое другое, в том числе из другого процесса (data_version)
+        stamp = (conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes)
+        if getattr(self.local, 'stamp', None) != stamp:
+            self.local.generations = dict(conn.execute("SELECT Таблица, Номер FROM Поколения").fetchall())
+            self.local.stamp = stamp
+        return tuple(self.local.generations.get(table, 0) for table in tables)
+
+    def cached_query(self, tables, sql, parameters=()):
+        # Чтение через кэш результатов; tables — таблицы, от которых зависит результат.
+        # Внутри транзакции кэш не используется: незафиксированные изменения могут откатиться
+        conn = self.connect_db()
+        if self.cache is None or conn.in_transaction:
+            return conn.execute(sql, parameters).fetchall()
+        generations = self.generations(conn, tables)
+        key = (sql, parameters)
+        rows = self.cache.get(key, generations)
+        if rows is None:
+            # Поколения прочитаны до запроса: запись, зафиксированная между ними, лишь вызовет повторное чтение
+            rows = conn.execute(sql, parameters).fetchall()
+            self.cache.put(key, generations, rows)
+        return rows
+
+    def fetch_page(self, table_name, after=None, before=None, limit=200, order_by=None, descending=False,
+                   filters=None):
+        # Keyset-пагинация: страница строк после (или перед) заданным ключом, без OFFSET.
+        # При сортировке по столбцу order_by ключ страницы — пара (значение, первичный ключ).
+        # filters — {столбец: значение или (от, до)}; сортировка и фильтры становятся ORDER BY и WHERE
+        key = PRIMARY_KEYS[table_name]
+        if order_by is not None and order_by not in COLUMNS[table_name]:
+            raise ValueError(f"Неизвестный столбец {order_by} таблицы {table_name}")
+        where, parameters = self.filter_clause(table_name, filters)
+        # Обход вперёд — в порядке возрастания, назад — в порядке убывания
+        forward = (before is None) != descending
+        cursor = after if before is None else before
+        if order_by in (None, key):
+            segments = [self.key_segment(key, cursor, forward)]
+        else:
+            segments = self.sort_segments(order_by, key, cursor, forward)
+        rows = []
+        for condition, values, order in segments:
+            if len(rows) >= limit:
+                break
+            conditions = ' AND '.join(part for part in (where, condition) if part)
+            rows += self.cached_query((table_name,), f"SELECT * FROM {table_name}"
+                                                     f"{' WHERE ' + conditions if conditions else ''} "
+                                                     f"ORDER BY {order} LIMIT ?",
+                                      (*parameters, *values, limit - len(rows)))
+        return rows[::-1] if before is not None else rows
+
+    def filter_clause(self, table_name, filters):
+        conditions, parameters = [], []
+        for column, value in (filters or {}).items():
+            if column not in COLUMNS[table_name]:
+                raise ValueError(f"Неизвестный столбец {column} таблицы {table_name}")
+            if isinstance(value, (tuple, list)):
+                low, high = value
+                if low is not None:
+                    conditions.append(f"{column} >= ?")
+                    parameters.append(low)
+                if high is not None:
+                    conditions.append(f"{column} <= ?")
+                    parameters.append(high)
+            else:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        return ' AND '.join(conditions), parameters
+
+    def key_segment(self, key, cursor, forward):
+        # (условие, параметры, порядок) для обхода по первичному ключу
+        if forward:
+            return (f"{key} > ?", (cursor,), key) if cursor is not None else (None, (), key)
+        return (f"{key} < ?", (cursor,), f"{key} DESC") if cursor is not None else (None, (), f"{key} DESC")
+
+    def sort_segments(self, column, key, cursor, forward):
+        # SQLite ставит NULL перед любыми значениями, поэтому обход идёт двумя участками: строки с NULL
+        # по первичному ключу и остальные по (значение, ключ). Сравнение пар (столбец, ключ) > (?, ?)
+        # использует индекс по столбцу
+        value, row_id = cursor if cursor is not None else (None, None)
+        if forward:
+            if cursor is None:
+                nulls = (f"{column} IS NULL", (), key)
+            elif value is None:
+                nulls = (f"{column} IS NULL AND {key} > ?", (row_id,), key)
+            else:
+                return [(f"({column}, {key}) > (?, ?)", (value, row_id), f"{column}, {key}")]
+            return [nulls, (f"{column} IS NOT NULL", (), f"{column}, {key}")]
+        if value is None and cursor is not None:
+            return [(f"{column} IS NULL AND {key} < ?", (row_id,), f"{key} DESC")]
+        if cursor is None:
+            values = (f"{column} IS NOT NULL", (), f"{column} DESC, {key} DESC")
+        else:
+            values = (f"({column}, {key}) < (?, ?)", (value, row_id), f"{column} DESC, {key} DESC")
+        return [values, (f"{column} IS NULL", (), f"{key} DESC")]
+
+    def lookup_names(self, table_name, keys):
+        # Пары (ключ, название) клиентов или услуг — один запрос на страницу сделок, а не на строку
+        keys = tuple(dict.fromkeys(key for key in keys if key is not None))
+        if not keys:
+            return []
+        key = PRIMARY_KEYS[table_name]
+        return self.cached_query((table_name,), f"SELECT {key}, Название FROM {table_name} "
+                                                f"WHERE {key} IN ({', '.join('?' * len(keys))})", keys)
+
+    def insert_row(self, table_name, row):
+        # Возвращает изменённые строки по таблицам: {таблица: {'upserted': [...], 'deleted': [...]}}
+        # Существующая строка обновляется на месте (upsert), а не удаляется,
+        # поэтому каскад на Сделки не срабатывает
+        if row[0] in (None, ''):
+            # Пустое поле ID в форме: ключ назначает SQLite ('' в INTEGER PRIMARY KEY не записать)
+            row = (None, *row[1:])
+        with self.transaction(immediate=True) as conn:
+            c = conn.cursor()
+            changes = {}
+            c.execute(self.upsert_sql(table_name, COLUMNS[table_name]), row)
+            self.collect_rows(c, changes, table_name, c.lastrowid if row[0] is None else row[0])
+        return changes
+
+    def update_row(self, table_name, row):
+        key, *columns = COLUMNS[table_name]
+        assignments = ', '.join(f"{column} = ?" for column in columns)
+        with self.transaction(immediate=True) as conn:
+            c = conn.cursor()
+            c.execute(f"UPDATE {table_name} SET {assignments} WHERE {key} = ?", (*row[1:], row[0]))
+            changes = {}
+            if c.rowcount:
+                self.collect_rows(c, changes, table_name, row[0])
+        return changes
+
+    def delete_row(self, table_name, row_id):
+        key = PRIMARY_KEYS[table_name]
+        with self.transaction(immediate=True) as conn:
+            c = conn.cursor()
+            changes = self.collect_cascade(c, table_name, row_id)
+            c.execute(f"DELETE FROM {table_name} WHERE {key} = ?", (row_id,))
+            if c.rowcount:
+                changes.setdefault(table_name, {'upserted': [], 'deleted': []})['deleted'].append(row_id)
+        return changes
+
+    def get_row(self, table_name, row_id):
+        c = self.connect_db().cursor()
+        c.execute(f"SELECT * FROM {table_name} WHERE {PRIMARY_KEYS[table_name]} = ?", (row_id,))
+        return c.fetchone()
+
+    def search(self, table_name, text, limit=100):
+        # Полнотекстовый поиск, результаты упорядочены по релевантности (bm25)
+        query = search_query(text)
+        if not query:
+            return []
+        fts = f"{table_name}_поиск"
+        return self.cached_query((table_name,), f"SELECT {table_name}.* FROM {fts} JOIN {table_name} "
+                                                f"ON {table_name}.{PRIMARY_KEYS[table_name]} = {fts}.rowid "
+                                                f"WHERE {fts} MATCH ? ORDER BY {fts}.rank LIMIT ?", (query, limit))
+
+    def report(self, table_name, limit=100):
+        # Оборот по клиентам или услугам из итоговой таблицы, крупнейшие первыми:
+        # (код, название, число сделок, сумма, комиссионные, средняя сумма)
+        # Итоговые таблицы меняются только триггерами на Сделки, поэтому зависят от её поколения
+        summary, column = SUMMARIES[table_name]
+        return self.cached_query(('Сделки', table_name),
+                                 f"SELECT s.{column}, t.Название, s.Количество, s.Сумма, s.Комиссионные, "
+                                 f"s.Сумма / s.Количество FROM {summary} s LEFT JOIN {table_name} t "
+                                 f"ON t.{column} = s.{column} ORDER BY s.Сумма DESC LIMIT ?", (limit,))
+
+    def report_row(self, table_name, row_id):
+        # Итоги одного клиента или одной услуги — поиск по первичному ключу итоговой таблицы
+        summary, column = SUMMARIES[table_name]
+        c = self.connect_db().cursor()
+        c.execute(f"SELECT Количество, Сумма, Комиссионные FROM {summary} WHERE {column} = ?", (row_id,))
+        row = c.fetchone()
+        return self.summary_dict(row or (0, 0.0, 0.0))
+
+    def report_totals(self):
+        rows = self.cached_query(('Сделки',), "SELECT Количество, Сумма, Комиссионные FROM Итоги_общие")
+        return self.summary_dict(rows[0])
+
+    def summary_dict(self, row):
+        count, amount, commission = row
+        return {'count': count, 'amount': amount, 'commission': commission,
+                'average': amount / count if count else 0.0}
+
+    def collect_cascade(self, c, table_name, row_id):
+        # Ключи зависимых строк, которые удалит каскад, если строка row_id существует
+        changes = {}
+        for child, column in CASCADES.get(table_name, ()):
+            c.execute(f"SELECT {PRIMARY_KEYS[child]} FROM {child} WHERE {column} = ?", (row_id,))
+            deleted = [key for key, in c.fetchall()]
+            if deleted:
+                changes[child] = {'upserted': [], 'deleted': deleted}
+        return changes
+
+    def collect_rows(self, c, changes, table_name, row_id):
+        c.execute(f"SELECT * FROM {table_name} WHERE {PRIMARY_KEYS[table_name]} = ?", (row_id,))
+        changes.setdefault(table_name, {'upserted': [], 'deleted': []})['upserted'].extend(c.fetchall())
+
+    def export_to_json(self, table_name, file_path=None, fmt='json', compress=False, chunk_size=5000,
+                       progress=None):
+        # Потоковая выгрузка: строки читаются через fetchmany и сразу пишутся в файл.
+        # fmt: 'json' — массив с отступами, 'compact' — массив без пробелов, 'ndjson' — объект на строку
+        if file_path is None:
+            file_path = json_file_name(table_name, fmt, compress)
+        c = self.connect_db().cursor()
+        c.execute(f"SELECT * FROM {table_name}")
+        columns = [desc[0] for desc in c.description]
+        if fmt == 'json':
+            encode = json.JSONEncoder(ensure_ascii=False, indent=4).encode
+            opening, separator, closing = "[\n    ", ",\n    ", "\n]"
+        elif fmt == 'compact':
+            encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+            opening, separator, closing = "[", ",", "]"
+        elif fmt == 'ndjson':
+            encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+            opening, separator, closing = "", "\n", "\n"
+        else:
+            raise ValueError(f"Неизвестный формат экспорта: {fmt}")
+
+        opener = gzip.open if compress else open
+        total = 0
+        with replacing(file_path) as tmp, opener(tmp, "wt", encoding="utf-8") as file:
+            while True:
+                rows = c.fetchmany(chunk_size)
+                if not rows:
+                    break
+                records = (encode(dict(zip(columns, row))) for row in rows)
+                if fmt == 'json':
+                    records = (record.replace("\n", "\n    ") for record in records)
+                file.write((separator if total else opening) + separator.join(records))
+                total += len(rows)
+                if progress is not None:
+                    progress(total)
+            if total:
+                file.write(closing)
+            elif fmt != 'ndjson':
+                file.write("[]")
+
+        return file_path
+
+    def change_watermark(self):
+        # Последний выданный номер журнала изменений (0 — изменений ещё не было); сжатие журнала его не сбрасывает
+        row = self.connect_db().execute("SELECT seq FROM sqlite_sequence WHERE name = 'Журнал_изменений'").fetchone()
+        return row[0] if row else 0
+
+    def export_changes(self, table_name, since=0, file_path=None, compress=False, chunk_size=5000, progress=None):
+        # NDJSON с изменениями таблицы после отметки since: по одной записи на ключ — текущая строка
+        # ({"Номер", "Операция": "upsert", "Строка"}) или удаление ({"Номер", "Операция": "delete", "Ключ"}).
+        # Журнал и строки читаются в одной транзакции; возвращается новая отметка для следующего запуска
+        if file_path is None:
+            file_path = changes_file_name(table_name, compress)
+        key = PRIMARY_KEYS[table_name]
+        encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+        opener = gzip.open if compress else open
+        total = 0
+        with self.transaction():
+            c = self.connect_db().cursor()
+            c.execute("SELECT IFNULL(MAX(Номер), ?) FROM Журнал_изменений", (since,))
+            watermark = c.fetchone()[0]
+            c.execute(f"SELECT last.Номер, last.Ключ, t.* FROM (SELECT Ключ, MAX(Номер) AS Номер "
+                      f"FROM Журнал_изменений WHERE Таблица = ? AND Номер > ? GROUP BY Ключ) last "
+                      f"LEFT JOIN {table_name} t ON t.{key} = last.Ключ ORDER BY last.Номер", (table_name, since))
+            columns = [desc[0] for desc in c.description[2:]]
+            with replacing(file_path) as tmp, opener(tmp, "wt", encoding="utf-8") as file:
+                while True:
+                    rows = c.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    for number, row_id, *row in rows:
+                        # Строки нет на момент выгрузки — для получателя это удаление
+                        if row[0] is None:
+                            record = {'Номер': number, 'Операция': 'delete', 'Ключ': row_id}
+                        else:
+                            record = {'Номер': number, 'Операция': 'upsert', 'Строка': dict(zip(columns, row))}
+                        file.write(encode(record) + "\n")
+                    total += len(rows)
+                    if progress is not None:
+                        progress(total)
+        return {'file': file_path, 'changes': total, 'since': since, 'watermark': watermark}
+
+    def compact_changes(self, before=None):
+        # Сжатие журнала: из нескольких записей об одном ключе остаётся последняя — выгрузке изменений
+        # нужна только она. Записи с номером до before (уже выгруженные всеми получателями) удаляются целиком
+        with self.transaction(immediate=True) as conn:
+            removed = conn.execute("DELETE FROM Журнал_изменений WHERE Номер NOT IN "
+                                   "(SELECT MAX(Номер) FROM Журнал_изменений GROUP BY Таблица, Ключ)").rowcount
+            if before is not None:
+                removed += conn.execute("DELETE FROM Журнал_изменений WHERE Номер <= ?", (before,)).rowcount
+        return removed
+
+    def import_from_json(self, table_name, file_path, batch_size=1000, commit_every=50000, progress=None):
+        # Файлы *.gz (например, после экспорта с compress=True) распаковываются на лету
+        opener = gzip.open if file_path.endswith(".gz") else open
+        try:
+            with opener(file_path, "rt", encoding="utf-8") as file:
+                return self.import_records(table_name, iter_json_records(file), batch_size, commit_every, progress)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"{file_path} not found.")
+        except json.JSONDecodeError:
+            raise ValueError(f"Error decoding JSON from {file_path}")
+
+    def import_records(self, table_name, records, batch_size=1000, commit_every=50000, progress=None):
+        # Строки группируются по набору столбцов и вставляются пачками через executemany,
+        # фиксация — каждые commit_every строк, поэтому память не зависит от размера файла
+        allowed = set(COLUMNS[table_name])
+        records = iter(records)
+        started = time.perf_counter()
+        total = 0
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        while True:
+            with self.transaction(immediate=True) as conn:
+                c = conn.cursor()
+                groups = {}
+                count = 0
+                # Порция не меньше пачки загружается без построчных триггеров (см. start_bulk)
+                bulk = None
+                for record in islice(records, commit_every):
+                    columns = tuple(record)
+                    batch = groups.get(columns)
+                    if batch is None:
+                        unknown = set(columns) - allowed
+                        if unknown:
+                            raise ValueError(f"Неизвестные столбцы для {table_name}: {', '.join(sorted(unknown))}")
+                        batch = groups[columns] = []
+                    batch.append(tuple(record.values()))
+                    if len(batch) >= batch_size:
+                        if bulk is None:
+                            bulk = self.start_bulk(c, table_name)
+                        self.add_counts(counts, self.upsert_batch(c, table_name, columns, batch, bulk))
+                        batch.clear()
+                    count += 1
+                for columns, batch in groups.items():
+                    if batch:
+                        self.add_counts(counts, self.upsert_batch(c, table_name, columns, batch, bulk))
+                if bulk is not None:
+                    self.finish_bulk(c, table_name, bulk)
+            if not count:
+                break
+            # Пауза между порциями длиннее шага опроса в begin_immediate: запись из другого процесса
+            # не ждёт конца всего импорта
+            time.sleep(0.002)
+            total += count
+            if progress is not None:
+                elapsed = time.perf_counter() - started
+                progress(total, total / elapsed if elapsed else 0.0)
+        elapsed = time.perf_counter() - started
+        return {'rows': total, **counts, 'seconds': elapsed,
+                'rows_per_second': total / elapsed if elapsed else 0.0}
+
+    def upsert_batch(self, c, table_name, columns, rows, bulk=None):
+        # INSERT ... ON CONFLICT DO UPDATE меняет строку на месте (без DELETE и каскада)
+        # и только если значения действительно отличаются; возвращает (вставлено, обновлено, без изменений)
+        key = PRIMARY_KEYS[table_name]
+        sql = self.upsert_sql(table_name, columns)
+        if key not in columns:
+            c.executemany(sql, rows)
+            return len(rows), 0, 0
+        position = columns.index(key)
+        keys = [row[position] for row in rows]
+        keys_json = json.dumps(keys)
+        if bulk is not None:
+            # Прежнее состояние строк — до первого их изменения в порции
+            c.execute(f"INSERT OR IGNORE INTO temp.{table_name}_до SELECT * FROM {table_name} "
+                      f"WHERE {key} IN (SELECT value FROM json_each(?))", (keys_json,))
+            c.execute("INSERT OR IGNORE INTO temp.Ключи_загрузки SELECT value FROM json_each(?) "
+                      "WHERE value IS NOT NULL", (keys_json,))
+        c.execute(f"SELECT {key} FROM {table_name} WHERE {key} IN (SELECT value FROM json_each(?))", (keys_json,))
+        seen = {existing for existing, in c.fetchall()}
+        inserted = 0
+        for row_key in keys:
+            row_key = as_key(row_key)
+            if row_key is None or row_key not in seen:
+                inserted += 1
+                seen.add(row_key)
+        c.executemany(sql, rows)
+        # rowcount не учитывает строки, для которых условие WHERE у DO UPDATE ложно
+        changed = c.rowcount
+        return inserted, changed - inserted, len(rows) - changed
+
+    def start_bulk(self, c, table_name):
+        # Построчные триггеры (FTS, итоги, поколения, журнал) удаляются до конца порции, а finish_bulk
+        # выполняет их работу несколькими запросами на всю порцию и создаёт триггеры заново. Всё это —
+        # в транзакции порции: другие соединения триггеров без себя не видят, а откат их возвращает
+        key = PRIMARY_KEYS[table_name]
+        others = ', '.join(COLUMNS[table_name][1:])
+        for name in ('до', 'после'):
+            c.execute(f"CREATE TEMP TABLE IF NOT EXISTS {table_name}_{name} ({key} INTEGER PRIMARY KEY, {others})")
+        c.execute("CREATE TEMP TABLE IF NOT EXISTS Ключи_загрузки (Ключ INTEGER PRIMARY KEY)")
+        c.execute("CREATE TEMP TABLE IF NOT EXISTS Изменения_загрузки (Ключ INTEGER PRIMARY KEY, Операция TEXT)")
+        self.clear_bulk(c, table_name)
+        # Строки без ключа получают ключи больше прежнего максимума
+        last = c.execute(f"SELECT MAX({key}) FROM {table_name}").fetchone()[0]
+        names = bulk_triggers(table_name)
+        c.execute(f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' "
+                  f"AND name IN ({', '.join('?' * len(names))})", names)
+        triggers = c.fetchall()
+        for name, _ in triggers:
+            c.execute(f"DROP TRIGGER {name}")
+        return last, triggers
+
+    def finish_bulk(self, c, table_name, bulk):
+        last, triggers = bulk
+        key = PRIMARY_KEYS[table_name]
+        before, after, changes = f"temp.{table_name}_до", f"temp.{table_name}_после", "temp.Изменения_загрузки"
+        # Новое состояние затронутых строк: ключи из порции и строки, вставленные без ключа
+        c.execute(f"INSERT INTO {after} SELECT * FROM {table_name} "
+                  f"WHERE {key} IN (SELECT Ключ FROM temp.Ключи_загрузки)")
+        if last is None:
+            c.execute(f"INSERT OR IGNORE INTO {after} SELECT * FROM {table_name}")
+        else:
+            c.execute(f"INSERT OR IGNORE INTO {after} SELECT * FROM {table_name} WHERE {key} > ?", (last,))
+        differs = ' OR '.join(f"p.{column} IS NOT d.{column}" for column in COLUMNS[table_name][1:])
+        c.execute(f"INSERT INTO {changes} SELECT p.{key}, CASE WHEN d.{key} IS NULL THEN 'I' ELSE 'U' END "
+                  f"FROM {after} p LEFT JOIN {before} d ON d.{key} = p.{key} WHERE d.{key} IS NULL OR {differs}")
+        if c.execute(f"SELECT EXISTS (SELECT 1 FROM {changes})").fetchone()[0]:
+            fts = f"{table_name}_поиск"
+            names = ', '.join(SEARCH_COLUMNS[table_name])
+            old_values = ', '.join(f"d.{column}" for column in SEARCH_COLUMNS[table_name])
+            new_values = ', '.join(f"p.{column}" for column in SEARCH_COLUMNS[table_name])
+            c.execute(f"INSERT INTO {fts} ({fts}, rowid, {names}) SELECT 'delete', d.{key}, {old_values} "
+                      f"FROM {before} d JOIN {changes} i ON i.Ключ = d.{key}")
+            c.execute(f"INSERT INTO {fts} (rowid, {names}) SELECT p.{key}, {new_values} "
+                      f"FROM {after} p JOIN {changes} i ON i.Ключ = p.{key}")
+            if table_name == 'Сделки':
+                for statement in summary_delta_statements(before, after, changes):
+                    c.execute(statement)
+            c.execute("UPDATE Поколения SET Номер = Номер + 1 WHERE Таблица = ?", (table_name,))
+            c.execute(f"INSERT INTO Журнал_изменений (Таблица, Операция, Ключ) SELECT ?, Операция, Ключ "
+                      f"FROM {changes} ORDER BY Ключ", (table_name,))
+        for _, sql in triggers:
+            c.execute(sql)
+        self.clear_bulk(c, table_name)
+
+    def clear_bulk(self, c, table_name):
+        for name in (f"{table_name}_до", f"{table_name}_после", "Ключи_загрузки", "Изменения_загрузки"):
+            c.execute(f"DELETE FROM temp.{name}")
+
+    def upsert_sql(self, table_name, columns):
+        key = PRIMARY_KEYS[table_name]
+        sql = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        if key not in columns:
+            return sql
+        others = [column for column in columns if column != key]
+        if not others:
+            return sql + " ON CONFLICT DO NOTHING"
+        return (sql + f" ON CONFLICT({key}) DO UPDATE SET "
+                      f"{', '.join(f'{column} = excluded.{column}' for column in others)} "
+                      f"WHERE {' OR '.join(f'{column} IS NOT excluded.{column}' for column in others)}")
+
+    def add_counts(self, counts, batch_counts):
+        inserted, updated, unchanged = batch_counts
+        counts['inserted'] += inserted
+        counts['updated'] += updated
+        counts['unchanged'] += unchanged
+
+    def export_to_excel(self, table_name, file_path=None, chunk_size=5000, progress=None):
+        # openpyxl импортируется только здесь: остальным операциям он не нужен
+        import openpyxl
+
+        # Книга в режиме write_only: строки сразу сбрасываются на диск, а не копятся в памяти
+        workbook = openpyxl.Workbook(write_only=True)
+        with self.transaction():
+            self.check_sheet_rows(table_name)
+            self.fill_sheet(workbook, table_name, chunk_size, progress)
+
+        if file_path is None:
+            file_path = f"{table_name}.xlsx"
+        with self.stats.span("openpyxl: сохранение книги"):
+            workbook.save(file_path)
+
+        return file_path
+
+    def check_sheet_rows(self, table_name):
+        # Книгу с листом длиннее предела Excel не откроет — ошибка до начала записи
+        count = self.connect_db().execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+        if count > EXCEL_MAX_ROWS:
+            raise ValueError(f"Таблица {table_name} ({count} строк) не помещается на лист Excel "
+                             f"(не более {EXCEL_MAX_ROWS} строк); выгрузите её в JSON или NDJSON")
+
+    def fill_sheet(self, workbook, table_name, chunk_size=5000, progress=None, total=0):
+        # Лист с заголовками столбцов и строками таблицы, читаемыми порциями; возвращает счётчик строк
+        sheet = workbook.create_sheet(table_name)
+        c = self.connect_db().cursor()
+        c.execute(f"SELECT * FROM {table_name}")
+        sheet.append([desc[0] for desc in c.description])
+        while True:
+            rows = c.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                sheet.append(row)
+            total += len(rows)
+            if progress is not None:
+                progress(total)
+        return total
+
+    def snapshot(self, file_path):
+        # Согласованная копия базы через backup API: все страницы копируются в одной транзакции чтения
+        target = sqlite3.connect(file_path)
+        try:
+            self.connect_db().backup(target)
+            target.execute("PRAGMA journal_mode = WAL")
+        finally:
+            target.close()
+        return file_path
+
+    def backup(self, file_path, pages=256, sleep=0.005, progress=None, max_restarts=3):
+        # Онлайн-копия по pages страниц за шаг: между шагами блокировка отпускается и запись в базу
+        # продолжается. Копия пишется во временный файл и подменяет file_path только целиком.
+        # progress(скопировано страниц, всего страниц)
+        state = {'remaining': None, 'restarts': 0}
+
+        def step(status, remaining, total):
+            # Запись из другого соединения начинает копирование заново
+            if state['remaining'] is not None and remaining > state['remaining']:
+                state['restarts'] += 1
+                if state['restarts'] > max_restarts:
+                    raise BackupRestarted()
+            state['remaining'] = remaining
+            if progress is not None:
+                progress(total - remaining, total)
+
+        with replacing(file_path) as tmp:
+            target = sqlite3.connect(tmp)
+            try:
+                conn = self.connect_db()
+                try:
+                    conn.backup(target, pages=pages, sleep=sleep, progress=step)
+                except BackupRestarted:
+                    # База меняется быстрее, чем копируется по шагам, — копируем за один шаг.
+                    # В режиме WAL это одна транзакция чтения, которая не мешает записи
+                    conn.backup(target)
+            finally:
+                target.close()
+        return file_path
+
+    def backup_name(self):
+        return os.path.splitext(os.path.basename(self.db_name))[0]
+
+    def list_backups(self, directory='backups'):
+        # Копии, созданные rotate_backup, новые первыми
+        if not os.path.isdir(directory):
+            return []
+        prefix = f"{self.backup_name()}-"
+        names = sorted((name for name in os.listdir(directory) if name.startswith(prefix) and name.endswith('.db')),
+                       reverse=True)
+        return [os.path.join(directory, name) for name in names]
+
+    def rotate_backup(self, directory='backups', keep=10, progress=None):
+        # Копия с отметкой времени до микросекунд в имени (копии одной секунды не затирают друг друга);
+        # хранятся keep последних
+        os.makedirs(directory, exist_ok=True)
+        file_path = os.path.join(directory, f"{self.backup_name()}-{datetime.now():%Y%m%d-%H%M%S-%f}.db")
+        self.backup(file_path, progress=progress)
+        for old in self.list_backups(directory)[keep:]:
+            os.remove(old)
+        return file_path
+
+    def restore(self, file_path):
+        # Подмена файла базы резервной копией. Другие процессы не должны держать базу открытой
+        return self.finish_restore(self.prepare_restore(file_path))
+
+    def prepare_restore(self, file_path):
+        # Перенос копии рядом с базой, чтобы подмена в finish_restore была атомарной и быстрой, и её проверка.
+        # Может идти в фоне, пока с базой работают другие потоки; возвращает временный файл.
+        # Проверяется перенесённый файл, а не сама копия: копия базы в режиме WAL при открытии, даже только
+        # для чтения, оставила бы рядом с собой файлы -wal и -shm
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(os.path.abspath(self.db_name)))
+        os.close(fd)
+        try:
+            shutil.copyfile(file_path, tmp)
+            try:
+                check = sqlite3.connect(tmp)
+                try:
+                    ok = check.execute("PRAGMA quick_check").fetchone()[0] == 'ok'
+                finally:
+                    check.close()
+            except sqlite3.DatabaseError:
+                ok = False
+            if not ok:
+                raise ValueError(f"{file_path} не является исправной базой данных")
+        except BaseException:
+            for path in (tmp, tmp + '-wal', tmp + '-shm'):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        return tmp
+
+    def finish_restore(self, tmp):
+        # Закрывает соединения всех потоков: вызывающий ждёт, пока ни один поток не работает с базой
+        try:
+            with self.lock:
+                self.close_connections()
+                # Журнал WAL старой базы не должен примениться к восстановленной
+                for suffix in ('-wal', '-shm'):
+                    if os.path.exists(self.db_name + suffix):
+                        os.remove(self.db_name + suffix)
+                os.replace(tmp, self.db_name)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        if self.cache is not None:
+            self.cache.clear()
+        # Копия могла быть сделана до последних миграций
+        self.setup_database()
+        return self.db_name
+
+    def export_all(self, directory='.', fmt='ndjson', compress=False, max_workers=None, progress=None):
+        # Все таблицы из одного снимка базы; каждая сериализуется в своём процессе,
+        # так что выгрузка длится примерно столько, сколько выгрузка самой большой таблицы.
+        # Пул процессов импортируется только здесь: остальным операциям он не нужен
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        os.makedirs(directory, exist_ok=True)
+        files = {table_name: os.path.join(directory, json_file_name(table_name, fmt, compress))
+                 for table_name in COLUMNS}
+        total = 0
+        with tempfile.TemporaryDirectory(dir=directory) as tmp:
+            snapshot = self.snapshot(os.path.join(tmp, 'snapshot.db'))
+            parts = {table_name: os.path.join(tmp, os.path.basename(file_path))
+                     for table_name, file_path in files.items()}
+            # spawn, а не fork: выгрузку запускает рабочий поток многопоточного процесса Tk, и после fork дочерний
+            # процесс мог бы унаследовать блокировку (SQLite, logging), которую держал другой поток
+            with ProcessPoolExecutor(max_workers or min(len(files), os.cpu_count() or 1),
+                                     mp_context=multiprocessing.get_context('spawn')) as executor:
+                futures = [executor.submit(export_snapshot_table, snapshot, table_name, part, fmt, compress)
+                           for table_name, part in parts.items()]
+                try:
+                    for future in as_completed(futures):
+                        total += future.result()
+                        if progress is not None:
+                            progress(total)
+                except BaseException:
+                    # Ошибка или отмена: недоделанные выгрузки снимаются, прежние файлы в directory не тронуты
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    raise
+            # Все таблицы выгружены — файлы подменяются только теперь
+            for table_name, part in parts.items():
+                os.replace(part, files[table_name])
+        return files
+
+    def export_all_to_excel(self, file_path='notary_office.xlsx', chunk_size=5000, progress=None):
+        # Один лист на таблицу; все листы читаются в одной транзакции, то есть из одного снимка базы.
+        # openpyxl пишет книгу в одном потоке, поэтому листы заполняются по очереди
+        import openpyxl
+
+        workbook = openpyxl.Workbook(write_only=True)
+        total = 0
+        with self.transaction():
+            for table_name in COLUMNS:
+                self.check_sheet_rows(table_name)
+            for table_name in COLUMNS:
+                total = self.fill_sheet(workbook, table_name, chunk_size, progress, total)
+        with self.stats.span("openpyxl: сохранение книги"):
+            workbook.save(file_path)
+        return file_path
+
+    def import_from_excel(self, table_name, file_path, sheet_name=None, batch_size=1000, commit_every=50000,
+                          progress=None):
+        import openpyxl
+
+        # read_only: лист читается потоково, строка за строкой
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            if sheet_name is None:
+                sheet_name = table_name if table_name in workbook.sheetnames else workbook.sheetnames[0]
+            rows = workbook[sheet_name].iter_rows(values_only=True)
+            # Первая строка листа — заголовки столбцов, как при экспорте
+            header = next(rows, ())
+            # Значения сопоставляются заголовкам по позиции; столбцы без заголовка пропускаются
+            records = ({name: value for name, value in zip(header, row) if name is not None} for row in rows)
+            records = (record for record in records if any(value is not None for value in record.values()))
+            return self.import_records(table_name, records, batch_size, commit_every, progress)
+        finally:
+            workbook.close()
+
+
+def export_snapshot_table(snapshot_path, table_name, file_path, fmt, compress):
+    # Выполняется в дочернем процессе export_all: своё соединение со снимком базы; возвращает число строк
+    totals = []
+    with Database(snapshot_path, result_cache_bytes=0) as db:
+        db.export_to_json(table_name, file_path, fmt=fmt, compress=compress, progress=totals.append)
+    return totals[-1] if totals else 0
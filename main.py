@@ -1,131 +1,507 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
-import json
+import queue
+import bisect
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import filedialog
 
-import openpyxl
-
-
-class Database:
-    def __init__(self, db_name='notary_office.db'):
-        self.db_name = db_name
-        self.setup_database()
-
-    def connect_db(self):
-        conn = sqlite3.connect(self.db_name)
-        conn.execute("PRAGMA foreign_keys = ON")  # Включение поддержки внешних ключей
-        return conn
-
-    def setup_database(self):
-        conn = self.connect_db()
-        c = conn.cursor()
-
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS Клиенты (
-                Код_клиента INTEGER PRIMARY KEY,
-                Название TEXT,
-                Вид_деятельности TEXT,
-                Адрес TEXT,
-                Телефон TEXT
-            )
-        ''')
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS Услуги (
-                Код_услуги INTEGER PRIMARY KEY,
-                Название TEXT,
-                Описание TEXT
-            )
-        ''')
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS Сделки (
-                Код_сделки INTEGER PRIMARY KEY,
-                Код_клиента INTEGER,
-                Код_услуги INTEGER,
-                Сумма REAL,
-                Комиссионные REAL,
-                Описание TEXT,
-                FOREIGN KEY (Код_клиента) REFERENCES Клиенты (Код_клиента) ON DELETE CASCADE,
-                FOREIGN KEY (Код_услуги) REFERENCES Услуги (Код_услуги) ON DELETE CASCADE
-            )
-        ''')
-
-    def export_to_json(self, table_name):
-        conn = self.connect_db()
-        c = conn.cursor()
-        c.execute(f"SELECT * FROM {table_name}")
-        rows = c.fetchall()
-        columns = [desc[0] for desc in c.description]
-        data = [dict(zip(columns, row)) for row in rows]
-
-        with open(f"{table_name}.json", "w", encoding="utf-8") as file:
-            json.dump(data, file, ensure_ascii=False, indent=4)
-
-        # messagebox.showinfo("Экспорт данных", f"Данные успешно экспортированы в {table_name}.json")
-
-        return f"{table_name}.json"
-
-    def import_from_json(self, table_name):
-
-        # Окно выбора файла для импорта
-
-        file_path = filedialog.askopenfilename(
-            title="Выберите файл для импорта",
-            filetypes=[("JSON файлы", "*.json")]
-        )
-        if not file_path:
-            messagebox.showwarning("Ошибка", "Файл не выбран.")
-            return
+from database import Database, COLUMNS
+from service import RemoteDatabase
+
+# Резервное копирование по расписанию: каталог, интервал и число хранимых копий
+BACKUP_DIRECTORY = 'backups'
+BACKUP_INTERVAL = 60 * 60 * 1000  # мс
+BACKUP_KEEP = 24
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    # Фоновая операция; report передаётся в методы Database как колбэк прогресса
+    def __init__(self, title):
+        self.title = title
+        self.progress = None
+        self.cancelled = threading.Event()
 
+    def report(self, *progress):
+        # Вызывается из рабочего потока между порциями — здесь же проверяется отмена
+        if self.cancelled.is_set():
+            raise JobCancelled()
+        self.progress = progress
+
+    def describe(self):
+        if not self.progress:
+            return f"{self.title}..."
+        if isinstance(self.progress[0], str):
+            return f"{self.title}: {self.progress[0]}"
+        if len(self.progress) > 1:
+            return f"{self.title}: {self.progress[0]} строк ({self.progress[1]:.0f} строк/с)"
+        return f"{self.title}: {self.progress[0]} строк"
+
+
+class JobRunner:
+    # Выполняет операции с БД и файлами в пуле потоков. Tk не потокобезопасен, поэтому
+    # результаты складываются в очередь, которую поток Tk опрашивает через root.after
+    def __init__(self, root, on_change=None, max_workers=2, poll_interval=100):
+        self.root = root
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.results = queue.Queue()
+        self.jobs = []  # видимые в строке состояния операции
+        self.running = []  # все незавершённые операции, в том числе quiet
+        self.root.after(self.poll_interval, self.poll)
+
+    def submit(self, title, func, on_done=None, on_error=None, quiet=False):
+        # func получает Job; quiet — короткие служебные операции, не показываемые пользователю
+        job = Job(title)
+        self.running.append(job)
+        if not quiet:
+            self.jobs.append(job)
+        future = self.executor.submit(func, job)
+        future.add_done_callback(lambda done: self.results.put((job, done, on_done, on_error)))
+        return job
+
+    def poll(self):
+        # Следующий опрос планируется в любом случае: иначе после одной ошибки результаты больше не доходят
         try:
-            with open(file_path, "r", encoding="utf-8") as file:
-                data = json.load(file)
-        except FileNotFoundError:
-            raise FileNotFoundError(f"{table_name}.json not found.")
-        except json.JSONDecodeError:
-            raise ValueError(f"Error decoding JSON from {table_name}.json")
-
-        conn = self.connect_db()
-        c = conn.cursor()
-        for row in data:
-            columns = ', '.join(row.keys())
-            placeholders = ', '.join('?' * len(row))
-            values = tuple(row.values())
-            c.execute(f"INSERT OR REPLACE INTO {table_name} ({columns}) VALUES ({placeholders})", values)
-        conn.commit()
-        conn.close()
-
-    def export_to_excel(self, table_name):
-        # Создание новой рабочей книги и рабочего листа
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-        sheet.title = table_name
-
-        conn = self.connect_db()
-        c = conn.cursor()
-        c.execute(f"SELECT * FROM {table_name}")
-        rows = c.fetchall()
-        columns = [desc[0] for desc in c.description]
-
-        # Запись заголовков столбцов
-        sheet.append(columns)
-
-        # Запись данных строк
+            while True:
+                try:
+                    job, future, on_done, on_error = self.results.get_nowait()
+                except queue.Empty:
+                    break
+                self.running.remove(job)
+                if job in self.jobs:
+                    self.jobs.remove(job)
+                self.deliver(job, future, on_done, on_error)
+            if self.on_change is not None:
+                self.on_change(self.jobs)
+        finally:
+            self.root.after(self.poll_interval, self.poll)
+
+    def deliver(self, job, future, on_done, on_error):
+        try:
+            try:
+                result = future.result()
+            except JobCancelled:
+                messagebox.showinfo(job.title, "Операция отменена.")
+            except Exception as e:
+                if on_error is not None:
+                    on_error(e)
+                else:
+                    messagebox.showerror("Ошибка", str(e))
+            else:
+                if on_done is not None:
+                    on_done(result)
+        except Exception as e:
+            # Ошибка в обработчике результата
+            messagebox.showerror(job.title, str(e))
+
+    def cancel(self):
+        for job in self.jobs:
+            job.cancelled.set()
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def sqlite_order(value):
+    # Ключ сравнения в порядке SQLite: NULL, затем числа, затем строки
+    if value is None:
+        return 0, 0
+    return (1 if isinstance(value, (int, float)) else 2), value
+
+
+class Descending:
+    # Обратный порядок для bisect в окне, отсортированном по убыванию
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+
+class PagedTreeview:
+    # Treeview держит только окно из нескольких страниц таблицы и подгружает
+    # соседние страницы по мере прокрутки, поэтому память не растёт с размером таблицы.
+    # Сортировка (щелчок по заголовку) и фильтры выполняются SQLite, а не в Tk
+    def __init__(self, tree, db, table_name, scrollbar=None, jobs=None, page_size=200, max_pages=3,
+                 lookups=None, names=None, background=False):
+        self.tree = tree
+        self.db = db
+        self.table_name = table_name
+        self.scrollbar = scrollbar
+        self.jobs = jobs
+        self.page_size = page_size
+        self.max_rows = page_size * max_pages
+        self.prefetch = page_size // 2  # запас строк за пределами видимой области
+        self.columns = COLUMNS[table_name]
+        self.keys = []  # позиции строк окна (см. position) в порядке отображения
+        self.at_start = True
+        self.at_end = True
+        self.pending = False
+        # background — все страницы читаются в пуле jobs (клиент службы: поток Tk не ждёт ответа по сети);
+        # loading — число таких чтений в пути
+        self.background = background and jobs is not None
+        self.loading = 0
+        self.results = False  # в окне результаты поиска, а не страницы таблицы
+        self.generation = 0  # номер последней перезагрузки; устаревшие ответы отбрасываются
+        self.order_by = None  # None — по первичному ключу
+        self.descending = False
+        self.filters = {}
+        # Столбцы с кодами, вместо которых показываются названия: {номер столбца: таблица};
+        # names — общий для окон словарь {таблица: {код: название}}
+        self.lookups = lookups or {}
+        self.names = names if names is not None else {}
+        self.headings = {}
+        for name, column in zip(self.tree['columns'], self.columns):
+            self.headings[name] = self.tree.heading(name, 'text')
+            self.tree.heading(name, command=lambda column=column: self.sort(column))
+        self.tree.configure(yscrollcommand=self.on_scroll)
+
+    def query(self):
+        return {'order_by': self.order_by, 'descending': self.descending, 'filters': self.filters}
+
+    def position(self, row):
+        # Место строки в порядке выборки; сравнивается так же, как упорядочивает SQLite
+        if self.order_by is None:
+            key = row[0]
+        else:
+            key = (*sqlite_order(row[self.columns.index(self.order_by)]), row[0])
+        return Descending(key) if self.descending else key
+
+    def cursor(self, position):
+        # Ключ страницы для fetch_page: первичный ключ или (значение, первичный ключ)
+        key = position.key if self.descending else position
+        if self.order_by is None:
+            return key
+        return None if key[0] == 0 else key[1], key[2]
+
+    def row_id(self, position):
+        key = position.key if self.descending else position
+        return key if self.order_by is None else key[2]
+
+    def matches(self, row):
+        # Те же условия, что filter_clause в Database: NULL не проходит ни одно сравнение
+        for column, value in self.filters.items():
+            actual = row[self.columns.index(column)]
+            if actual is None:
+                return False
+            if isinstance(value, (tuple, list)):
+                low, high = value
+                if low is not None and sqlite_order(actual) < sqlite_order(low):
+                    return False
+                if high is not None and sqlite_order(actual) > sqlite_order(high):
+                    return False
+            elif sqlite_order(actual) != sqlite_order(value):
+                return False
+        return True
+
+    def load_names(self, rows):
+        # Недостающие названия для строк читаются одним запросом на страницу
+        for index, table_name in self.lookups.items():
+            names = self.names.setdefault(table_name, {})
+            missing = {row[index] for row in rows if row[index] is not None and row[index] not in names}
+            if missing:
+                names.update(self.db.lookup_names(table_name, list(missing)))
+        return rows
+
+    def display(self, rows):
+        # Коды заменяются названиями из словаря
+        if not self.lookups:
+            return rows
+        self.load_names(rows)
+        result = []
         for row in rows:
-            sheet.append(row)
+            values = list(row)
+            for index, table_name in self.lookups.items():
+                name = self.names[table_name].get(row[index])
+                if name is not None:
+                    values[index] = f"{name} ({row[index]})"
+            result.append(values)
+        return result
+
+    def insert_rows(self, index, rows):
+        with self.db.stats.span(f"Treeview: {self.table_name}"):
+            for offset, (row, values) in enumerate(zip(rows, self.display(rows))):
+                self.tree.insert('', index if index == 'end' else index + offset, iid=str(row[0]), values=values)
+
+    def sort(self, column):
+        # Повторный щелчок по тому же столбцу меняет направление
+        if column == self.columns[0]:
+            column = None
+        if column == self.order_by:
+            self.descending = not self.descending
+        else:
+            self.order_by, self.descending = column, False
+        active = self.order_by or self.columns[0]
+        for name, column in zip(self.tree['columns'], self.columns):
+            arrow = (" ▼" if self.descending else " ▲") if column == active else ""
+            self.tree.heading(name, text=self.headings[name] + arrow)
+        self.reload()
+
+    def set_filters(self, filters):
+        self.filters = filters
+        self.reload()
+
+    def reload(self):
+        self.tree.delete(*self.tree.get_children())
+        self.keys = []
+        self.results = False
+        self.at_start = True
+        self.at_end = False
+        if self.jobs is None:
+            self.load_next()
+            return
+        # Первая страница читается в фоне, дальнейшие — по мере прокрутки
+        self.generation += 1
+        generation = self.generation
+        query = self.query()
+        self.jobs.submit(f"Загрузка {self.table_name}",
+                         lambda job: self.load_names(self.db.fetch_page(self.table_name, limit=self.page_size,
+                                                                        **query)),
+                         on_done=lambda rows: self.fill(rows, generation), quiet=True)
+
+    def fill(self, rows, generation):
+        if generation != self.generation:
+            return
+        self.tree.delete(*self.tree.get_children())
+        self.keys = [self.position(row) for row in rows]
+        self.insert_rows('end', rows)
+        self.at_start = True
+        self.at_end = len(rows) < self.page_size
+
+    def on_scroll(self, first, last):
+        if self.scrollbar is not None:
+            self.scrollbar.set(first, last)
+        # Подгрузку откладываем до простоя, чтобы не менять дерево внутри его же колбэка
+        if not self.pending:
+            self.pending = True
+            self.tree.after_idle(self.check_window)
+
+    def check_window(self):
+        self.pending = False
+        if not self.keys:
+            return
+        first, last = self.tree.yview()
+        count = len(self.keys)
+        if not self.at_end and (1 - last) * count < self.prefetch:
+            self.load_next()
+        elif not self.at_start and first * count < self.prefetch:
+            self.load_previous()
+
+    def fetch(self, read, apply):
+        # Чтение страниц для окна: сразу или в фоне (background); ответ, пришедший после перезагрузки
+        # или перестроения окна, отбрасывается
+        if not self.background:
+            apply(read())
+            return
+        self.loading += 1
+        generation = self.generation
 
-        file_path = f"{table_name}.xlsx"
-        workbook.save(file_path)
+        def done(rows):
+            self.loading -= 1
+            if generation == self.generation:
+                apply(rows)
 
-        return file_path
+        def failed(error):
+            self.loading -= 1
+            messagebox.showerror("Ошибка", str(error))
+
+        self.jobs.submit(f"Загрузка {self.table_name}", lambda job: self.load_names(read()), on_done=done,
+                         on_error=failed, quiet=True)
+
+    def load_next(self):
+        # Пока страница читается в фоне, следующая не запрашивается: курсор окна ещё не сдвинулся
+        if self.loading:
+            return
+        after = self.cursor(self.keys[-1]) if self.keys else None
+        query = self.query()
+        self.fetch(lambda: self.db.fetch_page(self.table_name, after=after, limit=self.page_size, **query),
+                   self.append)
+
+    def append(self, rows):
+        if len(rows) < self.page_size:
+            self.at_end = True
+        if not rows:
+            return
+        anchor = self.first_visible()
+        self.insert_rows('end', rows)
+        self.keys.extend(self.position(row) for row in rows)
+        excess = len(self.keys) - self.max_rows
+        if excess > 0:
+            self.tree.delete(*[str(self.row_id(key)) for key in self.keys[:excess]])
+            del self.keys[:excess]
+            self.at_start = False
+        self.restore(anchor)
+
+    def load_previous(self):
+        if self.loading:
+            return
+        before = self.cursor(self.keys[0])
+        query = self.query()
+        self.fetch(lambda: self.db.fetch_page(self.table_name, before=before, limit=self.page_size, **query),
+                   self.prepend)
+
+    def prepend(self, rows):
+        if len(rows) < self.page_size:
+            self.at_start = True
+        if not rows:
+            return
+        anchor = self.first_visible()
+        self.insert_rows(0, rows)
+        self.keys[:0] = [self.position(row) for row in rows]
+        excess = len(self.keys) - self.max_rows
+        if excess > 0:
+            self.tree.delete(*[str(self.row_id(key)) for key in self.keys[-excess:]])
+            del self.keys[-excess:]
+            self.at_end = False
+        self.restore(anchor)
+
+    def show(self, row):
+        # Выделить строку; если она вне окна, окно перестраивается вокруг неё.
+        # iid элемента — первичный ключ, поэтому поиск строки в дереве не требует перебора
+        key = row[0]
+        if not self.tree.exists(str(key)):
+            if not self.matches(row):
+                # Строка не проходит фильтры — показываем её отдельно, как результат поиска
+                self.show_results([row])
+                return
+            self.generation += 1
+            self.results = False
+            cursor = self.cursor(self.position(row))
+            query = self.query()
+            self.fetch(lambda: (self.db.fetch_page(self.table_name, before=cursor, limit=self.prefetch, **query) +
+                                [row] + self.db.fetch_page(self.table_name, after=cursor, limit=self.page_size,
+                                                           **query)),
+                       lambda rows: self.surround(rows, key))
+            return
+        self.tree.selection_set(str(key))
+        self.tree.see(str(key))
+
+    def surround(self, rows, key):
+        # Окно из страниц до и после строки key, выделенной посередине
+        self.tree.delete(*self.tree.get_children())
+        self.keys = [self.position(row) for row in rows]
+        self.insert_rows('end', rows)
+        self.at_start = self.at_end = False
+        self.tree.selection_set(str(key))
+        self.tree.see(str(key))
+
+    def show_results(self, rows):
+        # Результаты поиска в порядке релевантности; подгрузка страниц при прокрутке отключена
+        self.generation += 1
+        self.tree.delete(*self.tree.get_children())
+        self.keys = [self.position(row) for row in rows]
+        self.results = True
+        self.at_start = self.at_end = True
+        self.insert_rows('end', rows)
+        if rows:
+            self.tree.selection_set(str(rows[0][0]))
+            self.tree.see(str(rows[0][0]))
+
+    def apply_changes(self, upserted=(), deleted=()):
+        # Точечное обновление окна вместо полной перезагрузки; позиция в keys совпадает с индексом в дереве.
+        # Удалённые ключи сверяются с окном (не больше max_rows строк), а не с деревом по одному:
+        # каскад может удалить сотни тысяч сделок
+        if deleted:
+            deleted = set(deleted)
+            gone = [position for position in self.keys if self.row_id(position) in deleted]
+            if gone:
+                self.tree.delete(*[str(self.row_id(position)) for position in gone])
+                self.keys = [position for position in self.keys if self.row_id(position) not in deleted]
+        for row in upserted:
+            key = row[0]
+            values = self.display([row])[0]
+            if self.results:
+                if self.tree.exists(str(key)):
+                    self.tree.item(str(key), values=values)
+                continue
+            old = self.tree.index(str(key)) if self.tree.exists(str(key)) else None
+            if old is not None:
+                del self.keys[old]
+            if not self.matches(row):
+                if old is not None:
+                    self.tree.delete(str(key))
+                continue
+            position = self.position(row)
+            index = bisect.bisect_left(self.keys, position)
+            if index == old:
+                # Место в порядке сортировки не изменилось
+                self.keys.insert(index, position)
+                self.tree.item(str(key), values=values)
+                continue
+            if old is not None:
+                self.tree.delete(str(key))
+            # Строки за границами загруженного окна появятся при прокрутке
+            if (index == 0 and not self.at_start) or (index == len(self.keys) and not self.at_end):
+                continue
+            self.keys.insert(index, position)
+            self.tree.insert('', index, iid=str(key), values=values)
+
+    def first_visible(self):
+        if not self.keys:
+            return None
+        index = int(self.tree.yview()[0] * len(self.keys))
+        return self.row_id(self.keys[min(index, len(self.keys) - 1)])
+
+    def restore(self, anchor):
+        # Возвращаем на место строку, которая была первой видимой до изменения окна
+        if anchor is not None and self.tree.exists(str(anchor)):
+            self.tree.yview_moveto(self.tree.index(str(anchor)) / len(self.keys))
 
 
 class App:
-    def __init__(self, root):
+    def __init__(self, root, db=None):
+        # db — Database или RemoteDatabase, когда App работает клиентом службы (service.py)
         self.root = root
         self.root.title("Система управления нотариальной конторой")
-        self.db = Database()
+        self.db = db if db is not None else Database()
+        # Через службу каждый вызов — запрос по сети, поэтому и страницы таблиц читаются в фоне
+        self.remote = isinstance(self.db, RemoteDatabase)
+        self.views = {}
+        self.names = {}  # {таблица: {код: название}} для столбцов клиентов и услуг в окне сделок
+        self.busy = False
         self.create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(BACKUP_INTERVAL, self.scheduled_backup)
+
+    def on_close(self):
+        self.jobs.shutdown()
+        self.db.close()
+        self.root.destroy()
+
+    def create_status_bar(self):
+        status_frame = ttk.Frame(self.root)
+        status_frame.grid(row=1, column=0, padx=10, pady=(0, 10), sticky='ew')
+        self.status_text = tk.StringVar(value="Готово")
+        ttk.Label(status_frame, textvariable=self.status_text).pack(side='left', fill='x', expand=True)
+        self.cancel_button = ttk.Button(status_frame, text="Отмена", state='disabled',
+                                        command=lambda: self.jobs.cancel())
+        self.cancel_button.pack(side='right', padx=5)
+        self.progress = ttk.Progressbar(status_frame, mode='indeterminate', length=200)
+        self.progress.pack(side='right', padx=5)
+
+    def update_status(self, jobs):
+        if jobs:
+            text = jobs[-1].describe()
+            if len(jobs) > 1:
+                text += f" (ещё операций: {len(jobs) - 1})"
+            self.status_text.set(text)
+            if not self.busy:
+                self.busy = True
+                self.progress.start(10)
+                self.cancel_button.state(['!disabled'])
+        elif self.busy:
+            self.busy = False
+            self.progress.stop()
+            self.cancel_button.state(['disabled'])
+            self.status_text.set("Готово")
 
     def create_widgets(self):
         # Создание менюбара
@@ -146,6 +522,29 @@ class App:
                               command=lambda: self.export_data_excel('Услуги', excel=True))
         file_menu.add_command(label="Экспорт Сделки в Excel",
                               command=lambda: self.export_data_excel('Сделки', excel=True))
+        file_menu.add_command(label="Импорт Клиенты из Excel", command=lambda: self.import_data('Клиенты', excel=True))
+        file_menu.add_command(label="Импорт Услуги из Excel", command=lambda: self.import_data('Услуги', excel=True))
+        file_menu.add_command(label="Импорт Сделки из Excel", command=lambda: self.import_data('Сделки', excel=True))
+
+        file_menu.add_command(label="Экспорт всех таблиц в NDJSON", command=self.export_all)
+        file_menu.add_command(label="Экспорт всех таблиц в Excel", command=lambda: self.export_all(excel=True))
+
+        service_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Сервис", menu=service_menu)
+        service_menu.add_command(label="Диагностика запросов", command=self.show_diagnostics)
+        service_menu.add_separator()
+        service_menu.add_command(label="Создать резервную копию", command=self.backup_now)
+        service_menu.add_command(label="Восстановить из резервной копии...", command=self.restore_backup)
+
+        ndjson_menu = tk.Menu(file_menu, tearoff=0)
+        file_menu.add_cascade(label="Экспорт в NDJSON (gzip)", menu=ndjson_menu)
+        for table_name in COLUMNS:
+            ndjson_menu.add_command(label=table_name,
+                                    command=lambda name=table_name: self.export_data(name, fmt='ndjson',
+                                                                                     compress=True))
+
+        self.create_status_bar()
+        self.jobs = JobRunner(self.root, on_change=self.update_status)
 
         frame = ttk.Frame(self.root)
         frame.grid(row=0, column=0, padx=10, pady=10, sticky='nsew')
@@ -154,57 +553,143 @@ class App:
         tab_clients = ttk.Frame(tab_control)
         tab_services = ttk.Frame(tab_control)
         tab_transactions = ttk.Frame(tab_control)
+        tab_reports = ttk.Frame(tab_control)
 
         tab_control.add(tab_clients, text='Клиенты')
         tab_control.add(tab_services, text='Услуги')
         tab_control.add(tab_transactions, text='Сделки')
+        tab_control.add(tab_reports, text='Отчёты')
         tab_control.grid(row=0, column=0, padx=5, pady=5, sticky='nsew')
 
         self.create_client_tab(tab_clients)
         self.create_service_tab(tab_services)
         self.create_transaction_tab(tab_transactions)
+        self.create_report_tab(tab_reports)
+        # Отчёты обновляются при каждом открытии вкладки
+        tab_control.bind('<<NotebookTabChanged>>',
+                         lambda event: self.refresh_reports() if tab_control.select() == str(tab_reports) else None)
 
     def export_data_excel(self, table_name, excel=False):
-        try:
-            if excel:
-                file_path = self.db.export_to_excel(table_name)
-                messagebox.showinfo("Экспорт данных", f"Данные успешно экспортированы в {file_path}.")
-            else:
-                file_path = self.db.export_to_json(table_name)
-                messagebox.showinfo("Экспорт данных", f"Данные успешно экспортированы в {file_path}.")
-        except Exception as e:
-            messagebox.showerror("Ошибка", str(e))
+        if excel:
+            self.jobs.submit(f"Экспорт {table_name} в Excel",
+                             lambda job: self.db.export_to_excel(table_name, progress=job.report),
+                             on_done=self.export_done)
+        else:
+            self.export_data(table_name)
+
+    def export_data(self, table_name, fmt='json', compress=False):
+        self.jobs.submit(f"Экспорт {table_name}",
+                         lambda job: self.db.export_to_json(table_name, fmt=fmt, compress=compress,
+                                                            progress=job.report),
+                         on_done=self.export_done)
+
+    def backup_progress(self, job):
+        return lambda copied, total: job.report(f"{copied * 100 // max(total, 1)}%")
+
+    def backup_now(self):
+        self.jobs.submit("Резервное копирование",
+                         lambda job: self.db.rotate_backup(BACKUP_DIRECTORY, BACKUP_KEEP, self.backup_progress(job)),
+                         on_done=lambda file_path: messagebox.showinfo("Резервное копирование",
+                                                                       f"Копия сохранена в {file_path}."))
+
+    def scheduled_backup(self):
+        # Копирование по шагам не блокирует работу с базой; ошибка не прерывает расписание
+        self.jobs.submit("Резервное копирование",
+                         lambda job: self.db.rotate_backup(BACKUP_DIRECTORY, BACKUP_KEEP),
+                         on_error=lambda error: self.status_text.set(f"Резервная копия не создана: {error}"),
+                         quiet=True)
+        self.root.after(BACKUP_INTERVAL, self.scheduled_backup)
+
+    def restore_backup(self):
+        # Восстановление закрывает соединения всех потоков, поэтому другие операции должны завершиться
+        if self.jobs.jobs:
+            messagebox.showwarning("Восстановление", "Дождитесь завершения текущих операций.")
+            return
+        file_path = filedialog.askopenfilename(title="Выберите резервную копию", initialdir=BACKUP_DIRECTORY,
+                                               filetypes=[("Базы SQLite", "*.db")])
+        if not file_path:
+            return
+        if not messagebox.askyesno("Восстановление", "Текущие данные будут заменены данными из копии. Продолжить?"):
+            return
 
-    def export_data(self, table_name):
-        try:
-            file_path = self.db.export_to_json(table_name)
-            messagebox.showinfo("Экспорт данных", f"Данные успешно экспортированы в {file_path}.")
-        except Exception as e:
-            messagebox.showerror("Ошибка", str(e))
+        # Копия проверяется и переносится к базе в фоне, а подменяет её finish_restore
+        self.jobs.submit("Восстановление", lambda job: self.db.prepare_restore(file_path),
+                         on_done=lambda tmp: self.finish_restore(tmp, file_path))
 
-    def import_data(self, table_name):
+    def finish_restore(self, tmp, file_path):
+        # Подмена закрывает соединения всех потоков, поэтому ждёт завершения всех фоновых операций, включая
+        # незаметные (страницы, поиск, отчёты, копирование по расписанию). Она идёт в потоке Tk: пока она
+        # выполняется, новые операции не начнутся
+        if self.jobs.running:
+            self.root.after(100, lambda: self.finish_restore(tmp, file_path))
+            return
         try:
-            self.db.import_from_json(table_name)
-            messagebox.showinfo("Импорт данных", "Данные успешно импортированы.")
-            if table_name == "Клиенты":
-                self.update_treeview(self.client_tree, "SELECT * FROM Клиенты",
-                                     ("ID", "Название", "Вид деятельности", "Адрес", "Телефон"))
-            elif table_name == "Услуги":
-                self.update_treeview(self.service_tree, "SELECT * FROM Услуги", ("ID", "Название", "Описание"))
-            elif table_name == "Сделки":
-                self.update_treeview(self.transaction_tree, "SELECT * FROM Сделки",
-                                     ("ID", "Код клиента", "Код услуги", "Сумма", "Комиссионные", "Описание"))
+            self.db.finish_restore(tmp)
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
+            return
+        for view in self.views.values():
+            view.reload()
+        self.refresh_reports()
+        messagebox.showinfo("Восстановление", f"База восстановлена из {file_path}.")
+
+    def export_all(self, excel=False):
+        # Все таблицы из одного снимка базы: одна книга Excel или по файлу NDJSON на таблицу
+        if excel:
+            file_path = filedialog.asksaveasfilename(title="Сохранить книгу", defaultextension=".xlsx",
+                                                     filetypes=[("Книги Excel", "*.xlsx")])
+            if file_path:
+                self.jobs.submit("Экспорт всех таблиц в Excel",
+                                 lambda job: self.db.export_all_to_excel(file_path, progress=job.report),
+                                 on_done=self.export_done)
+            return
+        directory = filedialog.askdirectory(title="Каталог для выгрузки")
+        if directory:
+            self.jobs.submit("Экспорт всех таблиц",
+                             lambda job: self.db.export_all(directory, progress=job.report),
+                             on_done=lambda files: self.export_done(directory))
+
+    def export_done(self, file_path):
+        messagebox.showinfo("Экспорт данных", f"Данные успешно экспортированы в {file_path}.")
+
+    def import_data(self, table_name, excel=False):
+        # Диалог выбора файла открывается в потоке Tk, сам импорт идёт в фоне
+        if excel:
+            file_path = filedialog.askopenfilename(title="Выберите файл для импорта",
+                                                   filetypes=[("Книги Excel", "*.xlsx")])
+            load = self.db.import_from_excel
+        else:
+            file_path = filedialog.askopenfilename(title="Выберите файл для импорта",
+                                                   filetypes=[("JSON файлы", "*.json"),
+                                                              ("NDJSON файлы", "*.ndjson *.jsonl")])
+            load = self.db.import_from_json
+        if not file_path:
+            messagebox.showwarning("Ошибка", "Файл не выбран.")
+            return
 
-    def update_treeview(self, treeview, query, columns):
-        conn = self.db.connect_db()
-        c = conn.cursor()
-        c.execute(query)
-        rows = c.fetchall()
-        treeview.delete(*treeview.get_children())
-        for row in rows:
-            treeview.insert('', 'end', values=row)
+        def done(stats):
+            messagebox.showinfo("Импорт данных",
+                                f"Данные успешно импортированы: {stats['rows']} строк "
+                                f"({stats['rows_per_second']:.0f} строк/с).\n"
+                                f"Добавлено: {stats['inserted']}, обновлено: {stats['updated']}, "
+                                f"без изменений: {stats['unchanged']}.")
+            self.views[table_name].reload()
+
+        def failed(error):
+            # Уже зафиксированные порции импорта остаются в базе
+            messagebox.showerror("Ошибка", str(error))
+            self.views[table_name].reload()
+
+        self.jobs.submit(f"Импорт {table_name}",
+                         lambda job: load(table_name, file_path, progress=job.report),
+                         on_done=done, on_error=failed)
+
+    def create_paged_view(self, parent, tree, table_name, lookups=None):
+        scrollbar = ttk.Scrollbar(parent, orient='vertical', command=tree.yview)
+        scrollbar.pack(side='right', fill='y')
+        tree.pack(side='left', fill='both', expand=True)
+        return PagedTreeview(tree, self.db, table_name, scrollbar, self.jobs, lookups=lookups, names=self.names,
+                             background=self.remote)
 
     def create_client_tab(self, parent):
         client_frame = ttk.Frame(parent)
@@ -241,22 +726,21 @@ class App:
         self.client_tree.heading("Вид деятельности", text="Вид деятельности")
         self.client_tree.heading("Адрес", text="Адрес")
         self.client_tree.heading("Телефон", text="Телефон")
-        self.client_tree.pack(fill='both', expand=True)
+        self.client_view = self.create_paged_view(parent, self.client_tree, 'Клиенты')
+        self.views['Клиенты'] = self.client_view
 
-        ttk.Label(client_frame, text="Поиск по ID клиента").grid(row=6, column=0, padx=5, pady=5)
+        ttk.Label(client_frame, text="Поиск (ID или текст)").grid(row=6, column=0, padx=5, pady=5)
         search_entry = tk.StringVar()
         self.client_entry = ttk.Entry(client_frame, textvariable=search_entry)
         self.client_entry.grid(row=6, column=1, padx=5, pady=5)
 
         ttk.Button(client_frame, text="Искать",
-                   command=lambda: self.search_data(self.client_entry, self.client_tree,
-                                                    ("Клиенты", "Код_клиента"))).grid(row=6,
-                                                                                      column=2,
-                                                                                      padx=5,
-                                                                                      pady=5)
+                   command=lambda: self.search_data(self.client_entry, self.client_view)).grid(row=6, column=2,
+                                                                                       padx=5, pady=5)
+        ttk.Button(client_frame, text="Сбросить",
+                   command=lambda: self.client_view.reload()).grid(row=6, column=3, padx=5, pady=5)
 
-        self.update_treeview(self.client_tree, "SELECT * FROM Клиенты",
-                             ("ID", "Название", "Вид деятельности", "Адрес", "Телефон"))
+        self.client_view.reload()
 
     def create_service_tab(self, parent):
         service_frame = ttk.Frame(parent)
@@ -282,21 +766,21 @@ class App:
         self.service_tree.heading("ID", text="ID")
         self.service_tree.heading("Название", text="Название")
         self.service_tree.heading("Описание", text="Описание")
-        self.service_tree.pack(fill='both', expand=True)
+        self.service_view = self.create_paged_view(parent, self.service_tree, 'Услуги')
+        self.views['Услуги'] = self.service_view
 
-        ttk.Label(service_frame, text="Поиск по ID услуги").grid(row=4, column=0, padx=5, pady=5)
+        ttk.Label(service_frame, text="Поиск (ID или текст)").grid(row=4, column=0, padx=5, pady=5)
         search_entry = tk.StringVar()
         self.service_entry = ttk.Entry(service_frame, textvariable=search_entry)
         self.service_entry.grid(row=4, column=1, padx=5, pady=5)
 
         ttk.Button(service_frame, text="Искать",
-                   command=lambda: self.search_data(self.service_entry, self.service_tree,
-                                                    ("Услуги", "Код_услуги"))).grid(row=4,
-                                                                                    column=2,
-                                                                                    padx=5,
-                                                                                    pady=5)
+                   command=lambda: self.search_data(self.service_entry, self.service_view)).grid(row=4, column=2,
+                                                                                        padx=5, pady=5)
+        ttk.Button(service_frame, text="Сбросить",
+                   command=lambda: self.service_view.reload()).grid(row=4, column=3, padx=5, pady=5)
 
-        self.update_treeview(self.service_tree, "SELECT * FROM Услуги", ("ID", "Название", "Описание"))
+        self.service_view.reload()
 
     def create_transaction_tab(self, parent):
         transaction_frame = ttk.Frame(parent)
@@ -334,194 +818,271 @@ class App:
                                                                                             pady=5)
 
         self.transaction_tree = ttk.Treeview(parent, columns=(
-            "ID", "Код клиента", "Код услуги", "Сумма", "Комиссионные", "Описание"), show='headings')
+            "ID", "Клиент", "Услуга", "Сумма", "Комиссионные", "Описание"), show='headings')
         self.transaction_tree.heading("ID", text="ID")
-        self.transaction_tree.heading("Код клиента", text="Код клиента")
-        self.transaction_tree.heading("Код услуги", text="Код услуги")
+        self.transaction_tree.heading("Клиент", text="Клиент")
+        self.transaction_tree.heading("Услуга", text="Услуга")
         self.transaction_tree.heading("Сумма", text="Сумма")
         self.transaction_tree.heading("Комиссионные", text="Комиссионные")
         self.transaction_tree.heading("Описание", text="Описание")
-        self.transaction_tree.pack(fill='both', expand=True)
+        self.transaction_view = self.create_paged_view(parent, self.transaction_tree, 'Сделки',
+                                                       lookups={1: 'Клиенты', 2: 'Услуги'})
+        self.views['Сделки'] = self.transaction_view
 
         # Поиск
 
-        ttk.Label(transaction_frame, text="Поиск по ID сделки").grid(row=7, column=0, padx=5, pady=5)
+        ttk.Label(transaction_frame, text="Поиск (ID или текст)").grid(row=7, column=0, padx=5, pady=5)
         search_entry = tk.StringVar()
         self.transaction_entry = ttk.Entry(transaction_frame, textvariable=search_entry)
         self.transaction_entry.grid(row=7, column=1, padx=5, pady=5)
 
         ttk.Button(transaction_frame, text="Искать",
-                   command=lambda: self.search_data(self.transaction_entry, self.transaction_tree,
-                                                    ("Сделки", "Код_сделки"))).grid(
+                   command=lambda: self.search_data(self.transaction_entry, self.transaction_view)).grid(
             row=7,
             column=2,
             padx=5,
             pady=5)
+        ttk.Button(transaction_frame, text="Сбросить",
+                   command=lambda: self.transaction_view.reload()).grid(row=7, column=3, padx=5, pady=5)
+
+        # Фильтры: пустое поле — без ограничения
+        filter_frame = ttk.Frame(transaction_frame)
+        filter_frame.grid(row=8, column=0, columnspan=4, sticky='w')
+        self.transaction_filters = {}
+        for column, (label, field) in enumerate((("ID клиента", 'client'), ("ID услуги", 'service'),
+                                                 ("Сумма от", 'amount_from'), ("до", 'amount_to'),
+                                                 ("Комиссионные от", 'commission_from'), ("до", 'commission_to'))):
+            ttk.Label(filter_frame, text=label).grid(row=0, column=column * 2, padx=5, pady=5)
+            self.transaction_filters[field] = tk.StringVar()
+            ttk.Entry(filter_frame, textvariable=self.transaction_filters[field], width=10).grid(
+                row=0, column=column * 2 + 1, padx=5, pady=5)
+        ttk.Button(filter_frame, text="Фильтровать", command=self.filter_transactions).grid(row=0, column=12, padx=5,
+                                                                                          pady=5)
+        ttk.Button(filter_frame, text="Сбросить фильтр", command=self.reset_transaction_filters).grid(
+            row=0, column=13, padx=5, pady=5)
 
-        self.update_treeview(self.transaction_tree, "SELECT * FROM Сделки",
-                             ("ID", "Код клиента", "Код услуги", "Сумма", "Комиссионные", "Описание"))
-
-    def search_data(self, entry, client_tree, where):
-        search_id = entry.get()
-        if not search_id:
-            messagebox.showerror("Error", "Введите ID для поиска.")
-            return
+        self.transaction_view.reload()
 
+    def filter_transactions(self):
+        values = {field: variable.get().strip() for field, variable in self.transaction_filters.items()}
         try:
-            search_id = int(search_id)
+            number = {field: (float(value) if 'amount' in field or 'commission' in field else int(value))
+                      if value else None for field, value in values.items()}
         except ValueError:
-            messagebox.showerror("Error", "Некорректный ID.")
+            messagebox.showerror("Ошибка", "Фильтры должны быть числами.")
+            return
+        filters = {}
+        if number['client'] is not None:
+            filters['Код_клиента'] = number['client']
+        if number['service'] is not None:
+            filters['Код_услуги'] = number['service']
+        if number['amount_from'] is not None or number['amount_to'] is not None:
+            filters['Сумма'] = (number['amount_from'], number['amount_to'])
+        if number['commission_from'] is not None or number['commission_to'] is not None:
+            filters['Комиссионные'] = (number['commission_from'], number['commission_to'])
+        self.transaction_view.set_filters(filters)
+
+    def reset_transaction_filters(self):
+        for variable in self.transaction_filters.values():
+            variable.set("")
+        self.transaction_view.set_filters({})
+
+    def create_report_tab(self, parent):
+        report_frame = ttk.Frame(parent)
+        report_frame.pack(padx=10, pady=10, fill='x')
+
+        self.report_summary = tk.StringVar()
+        ttk.Label(report_frame, textvariable=self.report_summary).grid(row=0, column=0, padx=5, pady=5, sticky='w')
+        ttk.Button(report_frame, text="Обновить", command=self.refresh_reports).grid(row=0, column=1, padx=5, pady=5)
+
+        columns = ("ID", "Название", "Сделок", "Сумма", "Комиссионные", "Средняя сумма")
+        self.report_trees = {}
+        for table_name, title in (('Клиенты', "Оборот по клиентам"), ('Услуги', "Оборот по услугам")):
+            ttk.Label(parent, text=title).pack(anchor='w', padx=10)
+            tree = ttk.Treeview(parent, columns=columns, show='headings', height=8)
+            for column in columns:
+                tree.heading(column, text=column)
+            tree.pack(fill='both', expand=True, padx=10, pady=(0, 10))
+            self.report_trees[table_name] = tree
+
+    def refresh_reports(self):
+        # Отчёты читают итоговые таблицы, которые поддерживаются триггерами на Сделки
+        def load(job):
+            return self.db.report_totals(), {table_name: self.db.report(table_name) for table_name in self.report_trees}
+
+        def show(result):
+            totals, reports = result
+            self.report_summary.set(f"Сделок: {totals['count']}, сумма: {totals['amount']:.2f}, "
+                                    f"комиссионные: {totals['commission']:.2f}, "
+                                    f"средняя сумма: {totals['average']:.2f}")
+            for table_name, rows in reports.items():
+                tree = self.report_trees[table_name]
+                tree.delete(*tree.get_children())
+                for key, name, count, amount, commission, average in rows:
+                    tree.insert('', 'end', values=(key, name, count, f"{amount:.2f}", f"{commission:.2f}",
+                                                   f"{average:.2f}"))
+
+        self.jobs.submit("Отчёты", load, on_done=show, quiet=True)
+
+    def show_diagnostics(self):
+        # Замеры запросов SQLite и участков Treeview/openpyxl, накопленные Database.stats
+        window = tk.Toplevel(self.root)
+        window.title("Диагностика запросов")
+
+        columns = ("Вид", "Запрос", "Вызовов", "Всего, мс", "Среднее, мс", "Макс., мс", "Строк", "Место вызова")
+        ttk.Label(window, text="Запросы и участки, самые затратные первыми").pack(anchor='w', padx=10, pady=(10, 0))
+        stats_tree = ttk.Treeview(window, columns=columns, show='headings', height=12)
+        for column in columns:
+            stats_tree.heading(column, text=column)
+        stats_tree.pack(fill='both', expand=True, padx=10, pady=5)
+
+        slow_columns = ("Время, мс", "Строк", "Запрос", "План", "Место вызова")
+        ttk.Label(window, text=f"Медленные запросы (дольше {self.db.stats.slow_threshold * 1000:.0f} мс)").pack(
+            anchor='w', padx=10)
+        slow_tree = ttk.Treeview(window, columns=slow_columns, show='headings', height=8)
+        for column in slow_columns:
+            slow_tree.heading(column, text=column)
+        slow_tree.pack(fill='both', expand=True, padx=10, pady=5)
+        cache_label = ttk.Label(window)
+        cache_label.pack(anchor='w', padx=10)
+
+        def refresh():
+            if self.db.cache is not None:
+                info = self.db.cache.info()
+                cache_label.config(text=f"Кэш результатов: {info['entries']} записей, {info['bytes'] // 1024} из "
+                                        f"{info['max_bytes'] // 1024} КиБ, попаданий {info['hits']}, "
+                                        f"промахов {info['misses']}")
+            snapshot = self.db.stats.snapshot()
+            stats_tree.delete(*stats_tree.get_children())
+            for entry in snapshot['entries']:
+                stats_tree.insert('', 'end', values=(
+                    entry['kind'], entry['text'], entry['calls'], f"{entry['seconds'] * 1000:.1f}",
+                    f"{entry['seconds'] * 1000 / max(entry['calls'], 1):.2f}", f"{entry['max_seconds'] * 1000:.1f}",
+                    entry['rows'], entry['site']))
+            slow_tree.delete(*slow_tree.get_children())
+            for event in reversed(snapshot['slow']):
+                slow_tree.insert('', 'end', values=(f"{event['seconds'] * 1000:.1f}", event['rows'], event['text'],
+                                                    "; ".join(event['plan'] or ()), event['site']))
+
+        def save():
+            file_path = filedialog.asksaveasfilename(title="Сохранить диагностику", defaultextension=".json",
+                                                     filetypes=[("JSON файлы", "*.json")])
+            if file_path:
+                self.db.stats.dump(file_path)
+                messagebox.showinfo("Диагностика", f"Замеры сохранены в {file_path}.", parent=window)
+
+        def reset():
+            self.db.stats.reset()
+            refresh()
+
+        buttons = ttk.Frame(window)
+        buttons.pack(fill='x', padx=10, pady=(0, 10))
+        ttk.Button(buttons, text="Обновить", command=refresh).pack(side='left', padx=5)
+        ttk.Button(buttons, text="Сохранить в файл", command=save).pack(side='left', padx=5)
+        ttk.Button(buttons, text="Сбросить", command=reset).pack(side='left', padx=5)
+        refresh()
+
+    def search_data(self, entry, view):
+        text = entry.get().strip()
+        if not text:
+            messagebox.showerror("Error", "Введите ID или текст для поиска.")
             return
-        conn = self.db.connect_db()
-        c = conn.cursor()
-
-        c.execute(f'SELECT * FROM {where[0]} WHERE {where[1]} = ?', (search_id,))
-
-        result = c.fetchone()
-        conn.close()
-
-        if result:
-            # Очистка предыдущих выделений
-            for item in client_tree.selection():
-                client_tree.selection_remove(item)
 
-            # Поиск строки и выделение её
-            for child in client_tree.get_children():
-                if client_tree.item(child)['values'][0] == result[0]:  # Сравнение по Код_клиента
-                    client_tree.selection_set(child)
-                    client_tree.see(child)  # Прокрутка к выделенной строке
-                    break
-        else:
-            messagebox.showinfo("Info", "ID не найден.")
+        def lookup(job):
+            # Число сначала ищется как ID, иначе (и для телефонов) — по полнотекстовому индексу
+            if text.isdigit():
+                row = self.db.get_row(view.table_name, int(text))
+                if row:
+                    return [row], True
+            return self.db.search(view.table_name, text), False
+
+        def found(result):
+            rows, exact = result
+            if exact:
+                view.show(rows[0])
+            elif rows:
+                view.show_results(rows)
+            else:
+                messagebox.showinfo("Info", "Ничего не найдено.")
+
+        self.jobs.submit("Поиск", lookup, on_done=found, quiet=True)
+
+    def apply_changes(self, changes):
+        for table_name, change in changes.items():
+            self.views[table_name].apply_changes(**change)
+        # Словарь названий для окна сделок: переименование требует перерисовать окно
+        renamed = False
+        for table_name in ('Клиенты', 'Услуги'):
+            names = self.names.get(table_name, {})
+            change = changes.get(table_name, {})
+            for row in change.get('upserted', ()):
+                if row[0] in names and names[row[0]] != row[1]:
+                    names[row[0]] = row[1]
+                    renamed = True
+            for key in change.get('deleted', ()):
+                names.pop(key, None)
+        if renamed:
+            self.views['Сделки'].reload()
+
+    def save(self, title, message, change):
+        # change выполняется в фоне: запись может ждать очереди писателей (например, порции импорта),
+        # а для службы это ещё и запрос по сети. Значения полей формы читаются в потоке Tk до вызова
+        def done(changes):
+            messagebox.showinfo(title, message)
+            self.apply_changes(changes)
+
+        self.jobs.submit(title, lambda job: change(), on_done=done)
 
     def add_client(self):
-        conn = self.db.connect_db()
-        c = conn.cursor()
-        c.execute('''
-            INSERT OR REPLACE INTO Клиенты (Код_клиента, Название, Вид_деятельности, Адрес, Телефон)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (self.client_id.get(),
-              self.client_name.get(), self.client_activity.get(), self.client_address.get(),
-              self.client_phone.get()))
-        conn.commit()
-        conn.close()
-        messagebox.showinfo("Добавление клиента", "Клиент успешно добавлен!")
-        self.update_treeview(self.client_tree, "SELECT * FROM Клиенты",
-                             ("ID", "Название", "Вид деятельности", "Адрес", "Телефон"))
+        row = (self.client_id.get(), self.client_name.get(), self.client_activity.get(), self.client_address.get(),
+               self.client_phone.get())
+        self.save("Добавление клиента", "Клиент успешно добавлен!", lambda: self.db.insert_row('Клиенты', row))
 
     def update_client(self):
-        conn = self.db.connect_db()
-        c = conn.cursor()
-        c.execute('''
-            UPDATE Клиенты
-            SET Название = ?, Вид_деятельности = ?, Адрес = ?, Телефон = ?
-            WHERE Код_клиента = ?
-        ''', (
-            self.client_name.get(), self.client_activity.get(), self.client_address.get(), self.client_phone.get(),
-            self.client_id.get()))
-        conn.commit()
-        conn.close()
-        messagebox.showinfo("Обновление клиента", "Клиент успешно обновлён!")
-        self.update_treeview(self.client_tree, "SELECT * FROM Клиенты",
-                             ("ID", "Название", "Вид деятельности", "Адрес", "Телефон"))
+        row = (self.client_id.get(), self.client_name.get(), self.client_activity.get(), self.client_address.get(),
+               self.client_phone.get())
+        self.save("Обновление клиента", "Клиент успешно обновлён!", lambda: self.db.update_row('Клиенты', row))
 
     def delete_client(self):
-        conn = self.db.connect_db()
-        c = conn.cursor()
-        c.execute('DELETE FROM Клиенты WHERE Код_клиента = ?', (int(self.client_id.get()),))
-        conn.commit()
-        conn.close()
-        messagebox.showinfo("Удаление клиента", "Клиент успешно удалён!")
-        self.update_treeview(self.client_tree, "SELECT * FROM Клиенты",
-                             ("ID", "Название", "Вид деятельности", "Адрес", "Телефон"))
-
-        self.update_treeview(self.transaction_tree, "SELECT * FROM Сделки",
-                             ("ID", "Код клиента", "Код услуги", "Сумма", "Комиссионные", "Описание"))
+        row_id = int(self.client_id.get())
+        self.save("Удаление клиента", "Клиент успешно удалён!", lambda: self.db.delete_row('Клиенты', row_id))
 
     def add_service(self):
-        conn = self.db.connect_db()
-        conn.execute('PRAGMA foreign_keys = ON;')
-        c = conn.cursor()
-        c.execute('''
-            INSERT OR REPLACE INTO Услуги (Код_услуги,Название, Описание)
-            VALUES (?, ?, ?)
-        ''', (self.service_id.get(), self.service_name.get(), self.service_description.get()))
-        conn.commit()
-        conn.close()
-        messagebox.showinfo("Добавление услуги", "Услуга успешно добавлена!")
-        self.update_treeview(self.service_tree, "SELECT * FROM Услуги", ("ID", "Название", "Описание"))
+        row = (self.service_id.get(), self.service_name.get(), self.service_description.get())
+        self.save("Добавление услуги", "Услуга успешно добавлена!", lambda: self.db.insert_row('Услуги', row))
 
     def update_service(self):
-        conn = self.db.connect_db()
-        c = conn.cursor()
-        c.execute('''
-            UPDATE Услуги
-            SET Название = ?, Описание = ?
-            WHERE Код_услуги = ?
-        ''', (self.service_name.get(), self.service_description.get(), self.service_id.get()))
-        conn.commit()
-        conn.close()
-        messagebox.showinfo("Обновление услуги", "Услуга успешно обновлена!")
-        self.update_treeview(self.service_tree, "SELECT * FROM Услуги", ("ID", "Название", "Описание"))
+        row = (self.service_id.get(), self.service_name.get(), self.service_description.get())
+        self.save("Обновление услуги", "Услуга успешно обновлена!", lambda: self.db.update_row('Услуги', row))
 
     def delete_service(self):
-        conn = self.db.connect_db()
-        conn.execute('PRAGMA foreign_keys = ON;')
-        c = conn.cursor()
-        c.execute('DELETE FROM Услуги WHERE Код_услуги = ?', (int(self.service_id.get()),))
-        conn.commit()
-        conn.close()
-        messagebox.showinfo("Удаление услуги", "Услуга успешно удалена!")
-        self.update_treeview(self.service_tree, "SELECT * FROM Услуги", ("ID", "Название", "Описание"))
-        self.update_treeview(self.transaction_tree, "SELECT * FROM Сделки",
-                             ("ID", "Код клиента", "Код услуги", "Сумма", "Комиссионные", "Описание"))
+        row_id = int(self.service_id.get())
+        self.save("Удаление услуги", "Услуга успешно удалена!", lambda: self.db.delete_row('Услуги', row_id))
+
+    def transaction_row(self):
+        return (self.transaction_id.get(), self.transaction_client_id.get(), self.transaction_service_id.get(),
+                self.transaction_amount.get(), self.transaction_commission.get(), self.transaction_description.get())
 
     def add_transaction(self):
-        conn = self.db.connect_db()
-        c = conn.cursor()
-        c.execute('''
-            INSERT OR REPLACE INTO Сделки (Код_сделки, Код_клиента, Код_услуги, Сумма, Комиссионные, Описание)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (self.transaction_id.get(), self.transaction_client_id.get(), self.transaction_service_id.get(),
-              self.transaction_amount.get(),
-              self.transaction_commission.get(), self.transaction_description.get()))
-        conn.commit()
-        conn.close()
-        messagebox.showinfo("Добавление сделки", "Сделка успешно добавлена!")
-        self.update_treeview(self.transaction_tree, "SELECT * FROM Сделки",
-                             ("ID", "Код клиента", "Код услуги", "Сумма", "Комиссионные", "Описание"))
+        row = self.transaction_row()
+        self.save("Добавление сделки", "Сделка успешно добавлена!", lambda: self.db.insert_row('Сделки', row))
 
     def update_transaction(self):
-        conn = self.db.connect_db()
-        c = conn.cursor()
-        c.execute('''
-            UPDATE Сделки
-            SET Код_клиента = ?, Код_услуги = ?, Сумма = ?, Комиссионные = ?, Описание = ?
-            WHERE Код_сделки = ?
-        ''', (self.transaction_client_id.get(), self.transaction_service_id.get(), self.transaction_amount.get(),
-              self.transaction_commission.get(), self.transaction_description.get(), self.transaction_id.get()))
-        conn.commit()
-        conn.close()
-        messagebox.showinfo("Обновление сделки", "Сделка успешно обновлена!")
-        self.update_treeview(self.transaction_tree, "SELECT * FROM Сделки",
-                             ("ID", "Код клиента", "Код услуги", "Сумма", "Комиссионные", "Описание"))
+        row = self.transaction_row()
+        self.save("Обновление сделки", "Сделка успешно обновлена!", lambda: self.db.update_row('Сделки', row))
 
     def delete_transaction(self):
-        conn = self.db.connect_db()
-        conn.execute('PRAGMA foreign_keys = ON;')
-        c = conn.cursor()
-        c.execute('DELETE FROM Сделки WHERE Код_сделки = ?', (int(self.transaction_id.get()),))
-        conn.commit()
-        conn.close()
-        messagebox.showinfo("Удаление сделки", "Сделка успешно удалена!")
-        self.update_treeview(self.transaction_tree, "SELECT * FROM Сделки",
-                             ("ID", "Код клиента", "Код услуги", "Сумма", "Комиссионные", "Описание"))
+        row_id = int(self.transaction_id.get())
+        self.save("Удаление сделки", "Сделка успешно удалена!", lambda: self.db.delete_row('Сделки', row_id))
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Система управления нотариальной конторой")
+    parser.add_argument('--service', help="адрес службы данных, например http://127.0.0.1:8765 или unix:/путь")
+    args = parser.parse_args()
     try:
         root = tk.Tk()
-        app = App(root)
+        app = App(root, RemoteDatabase(args.service) if args.service else None)
         root.mainloop()
     except KeyboardInterrupt:
         print("Program interrupted by user")
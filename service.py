@@ -0,0 +1,308 @@
+import os
+import sys
+import json
+import socket
+import sqlite3
+import asyncio
+import inspect
+import argparse
+import threading
+import http.client
+from functools import partial
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+from database import Database, QueryStats, COLUMNS, json_file_name, changes_file_name
+
+# Операции Database, доступные через службу. Чтение идёт параллельно в пуле потоков
+# (у каждого потока своё WAL-соединение), запись — через единственный поток записи
+READ_METHODS = {'fetch_page', 'lookup_names', 'get_row', 'search', 'report', 'report_row', 'report_totals',
+                'change_watermark', 'export_to_json', 'export_to_excel', 'export_all', 'export_all_to_excel',
+                'export_changes', 'rotate_backup'}
+# Короткие записи собираются в пачки: одна транзакция на пачку, SAVEPOINT на операцию
+WRITE_METHODS = {'insert_row', 'update_row', 'delete_row'}
+# Длинные записи со своими транзакциями выполняются в потоке записи по одной
+EXCLUSIVE_METHODS = {'import_from_json', 'import_from_excel', 'compact_changes'}
+# Параметр с путём у файловых операций и имя файла по умолчанию, которое выбрала бы Database
+FILE_ARGUMENTS = {
+    'export_to_json': ('file_path', lambda arguments: json_file_name(arguments['table_name'], arguments['fmt'],
+                                                                     arguments['compress'])),
+    'export_to_excel': ('file_path', lambda arguments: f"{arguments['table_name']}.xlsx"),
+    'export_changes': ('file_path', lambda arguments: changes_file_name(arguments['table_name'],
+                                                                        arguments['compress'])),
+    'export_all': ('directory', None),
+    'export_all_to_excel': ('file_path', None),
+    'rotate_backup': ('directory', None),
+    'import_from_json': ('file_path', None),
+    'import_from_excel': ('file_path', None),
+}
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+# Исключения, которые клиент поднимает под тем же типом, что и на сервере
+ERRORS = {error.__name__: error for error in (
+    ValueError, KeyError, TypeError, FileNotFoundError, PermissionError, OSError, sqlite3.Error, sqlite3.DatabaseError,
+    sqlite3.IntegrityError, sqlite3.OperationalError, sqlite3.ProgrammingError)}
+
+
+class RemoteError(Exception):
+    pass
+
+
+class DataService:
+    # Локальная HTTP/JSON-служба над Database: POST /<операция> с телом {"args": [...], "kwargs": {...}},
+    # ответ {"result": ...} или {"error": ..., "type": ...}
+    def __init__(self, db, readers=8, batch_size=100, files='files'):
+        self.db = db
+        self.batch_size = batch_size
+        # Файлы клиентов (выгрузки, загрузки, резервные копии) — только внутри этого каталога
+        self.files = os.path.realpath(files)
+        os.makedirs(self.files, exist_ok=True)
+        self.readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='reader')
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='writer')
+        self.writes = None  # asyncio.Queue создаётся в цикле событий службы
+
+    async def serve(self, host='127.0.0.1', port=8765, unix_socket=None):
+        self.writes = asyncio.Queue()
+        write_loop = asyncio.create_task(self.write_loop())
+        if unix_socket:
+            server = await asyncio.start_unix_server(self.handle, unix_socket)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            write_loop.cancel()
+            self.readers.shutdown(wait=True)
+            self.writer.shutdown(wait=True)
+
+    async def handle(self, reader, writer):
+        # HTTP/1.1 с keep-alive: клиент держит одно соединение на поток
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                status, payload = await self.dispatch(method, path, body)
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                             f"Content-Type: application/json; charset=utf-8\r\n"
+                             f"Content-Length: {len(data)}\r\n\r\n".encode('latin-1') + data)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, path, body):
+        name = path.strip('/')
+        if method == 'GET' and not name:
+            return 200, {'result': sorted(READ_METHODS | WRITE_METHODS | EXCLUSIVE_METHODS)}
+        if method != 'POST':
+            return 405, {'error': f"Метод {method} не поддерживается", 'type': 'RemoteError'}
+        if name not in READ_METHODS | WRITE_METHODS | EXCLUSIVE_METHODS:
+            return 404, {'error': f"Неизвестная операция: {name}", 'type': 'RemoteError'}
+        try:
+            request = json.loads(body or b'{}')
+            args, kwargs = request.get('args', []), request.get('kwargs', {})
+        except (ValueError, AttributeError):
+            return 400, {'error': "Тело запроса должно быть JSON-объектом", 'type': 'RemoteError'}
+
+        loop = asyncio.get_running_loop()
+        try:
+            args, kwargs = self.confine(name, args, kwargs)
+            if name in READ_METHODS:
+                result = await loop.run_in_executor(self.readers, partial(getattr(self.db, name), *args, **kwargs))
+            else:
+                future = loop.create_future()
+                await self.writes.put((name, args, kwargs, future))
+                result = await future
+        except Exception as e:
+            return (400 if type(e).__name__ in ERRORS else 500), {'error': str(e), 'type': type(e).__name__}
+        return 200, {'result': result}
+
+    def confine(self, name, args, kwargs):
+        # Служба работает от своей учётной записи и без проверки подлинности клиента. Имя таблицы
+        # подставляется в текст SQL, поэтому принимаются только таблицы приложения; пути файлов разрешаются
+        # только внутри self.files: иначе любой локальный пользователь мог бы через службу
+        # прочитать или перезаписать произвольный файл
+        bound = inspect.signature(getattr(self.db, name)).bind(*args, **kwargs)
+        bound.apply_defaults()
+        if 'table_name' in bound.arguments and bound.arguments['table_name'] not in COLUMNS:
+            raise ValueError(f"Неизвестная таблица: {bound.arguments['table_name']}")
+        if name not in FILE_ARGUMENTS:
+            return bound.args, bound.kwargs
+        parameter, default = FILE_ARGUMENTS[name]
+        path = bound.arguments[parameter]
+        if path is None:
+            path = default(bound.arguments)
+        resolved = os.path.realpath(os.path.join(self.files, path))
+        if os.path.commonpath((self.files, resolved)) != self.files:
+            raise PermissionError(f"Путь {path} вне каталога файлов службы {self.files}")
+        bound.arguments[parameter] = resolved
+        return bound.args, bound.kwargs
+
+    async def write_loop(self):
+        # Пачка — все короткие записи, накопившиеся в очереди; длинная запись выполняется отдельно
+        loop = asyncio.get_running_loop()
+        pending = None
+        while True:
+            item = pending or await self.writes.get()
+            pending = None
+            if item[0] in EXCLUSIVE_METHODS:
+                name, args, kwargs, future = item
+                try:
+                    result = await loop.run_in_executor(self.writer, partial(getattr(self.db, name), *args, **kwargs))
+                except Exception as e:
+                    self.settle(future, False, e)
+                else:
+                    self.settle(future, True, result)
+                continue
+            batch = [item]
+            while len(batch) < self.batch_size and not self.writes.empty():
+                item = self.writes.get_nowait()
+                if item[0] in EXCLUSIVE_METHODS:
+                    pending = item
+                    break
+                batch.append(item)
+            outcomes = await loop.run_in_executor(self.writer, self.apply_batch, [item[:3] for item in batch])
+            for (*_, future), (ok, value) in zip(batch, outcomes):
+                self.settle(future, ok, value)
+
+    def settle(self, future, ok, value):
+        # Клиент мог отключиться, не дождавшись ответа
+        if future.cancelled():
+            return
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+
+    def apply_batch(self, batch):
+        # Каждая операция Database открывает вложенную транзакцию (SAVEPOINT), поэтому ошибка одной операции
+        # откатывает только её, а пачка фиксируется одним COMMIT
+        outcomes = []
+        try:
+            with self.db.transaction(immediate=True):
+                for name, args, kwargs in batch:
+                    try:
+                        outcomes.append((True, getattr(self.db, name)(*args, **kwargs)))
+                    except Exception as e:
+                        outcomes.append((False, e))
+        except Exception as e:
+            return [(False, e)] * len(batch)
+        return outcomes
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=60):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class RemoteDatabase:
+    # Тонкий клиент DataService с интерфейсом Database, достаточным для App.
+    # address — "http://хост:порт" или "unix:/путь/к/сокету"
+    def __init__(self, address='http://127.0.0.1:8765', timeout=300):
+        self.address = address
+        self.timeout = timeout
+        self.stats = QueryStats()  # замеры участков на стороне клиента (Treeview)
+        self.cache = None  # кэш результатов работает в службе
+        self.local = threading.local()
+
+    def connection(self):
+        # Соединения HTTP/1.1 держатся открытыми, по одному на поток
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            if self.address.startswith('unix:'):
+                conn = UnixHTTPConnection(self.address[len('unix:'):], self.timeout)
+            else:
+                url = urlsplit(self.address)
+                conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=self.timeout)
+            self.local.conn = conn
+        return conn
+
+    def call(self, name, *args, **kwargs):
+        # Прогресс и отмена длинных операций через службу не передаются
+        kwargs.pop('progress', None)
+        body = json.dumps({'args': args, 'kwargs': kwargs}, ensure_ascii=False).encode('utf-8')
+        for attempt in (1, 2):
+            conn = self.connection()
+            try:
+                conn.request('POST', f"/{name}", body, {'Content-Type': 'application/json; charset=utf-8'})
+                response = conn.getresponse()
+                payload = json.loads(response.read())
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Служба закрыла простаивавшее соединение — одна повторная попытка с новым
+                conn.close()
+                self.local.conn = None
+                if attempt == 2:
+                    raise
+        if 'error' in payload:
+            raise ERRORS.get(payload['type'], RemoteError)(payload['error'])
+        return payload['result']
+
+    def __getattr__(self, name):
+        if name not in READ_METHODS | WRITE_METHODS | EXCLUSIVE_METHODS:
+            raise AttributeError(name)
+        return partial(self.call, name)
+
+    def restore(self, file_path):
+        raise RemoteError("Восстановление недоступно через службу: остановите службу и выполните "
+                          "python -m cli restore")
+
+    def prepare_restore(self, file_path):
+        return self.restore(file_path)
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m service',
+                                     description="Локальная служба данных нотариальной конторы для нескольких "
+                                                 "пользователей")
+    parser.add_argument('--db', default='notary_office.db', help="файл базы данных (по умолчанию %(default)s)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', help="Unix-сокет вместо TCP")
+    parser.add_argument('--readers', type=int, default=8, help="потоков чтения (по умолчанию %(default)s)")
+    parser.add_argument('--batch-size', type=int, default=100, help="записей в одной транзакции")
+    parser.add_argument('--files', default='files',
+                        help="каталог, где служба читает и пишет файлы клиентов (по умолчанию %(default)s)")
+    args = parser.parse_args(argv)
+
+    with Database(args.db) as db:
+        service = DataService(db, args.readers, args.batch_size, args.files)
+        print(f"Служба запущена: {f'unix:{args.socket}' if args.socket else f'http://{args.host}:{args.port}'}",
+              file=sys.stderr)
+        try:
+            asyncio.run(service.serve(args.host, args.port, args.socket))
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
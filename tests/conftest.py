@@ -0,0 +1,100 @@
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, COLUMNS  # noqa: E402
+from main import PagedTreeview  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    with Database(str(tmp_path / 'test.db')) as db:
+        yield db
+
+
+@pytest.fixture
+def deals(db):
+    # Сделки с повторами и NULL в сортируемых столбцах, чтобы страницы резали группы равных значений
+    rng = random.Random(42)
+    db.import_records('Клиенты', ({'Код_клиента': key, 'Название': f"Клиент {key}"} for key in range(1, 6)))
+    db.import_records('Услуги', ({'Код_услуги': key, 'Название': f"Услуга {key}"} for key in range(1, 4)))
+    db.import_records('Сделки', ({'Код_сделки': key, 'Код_клиента': rng.randint(1, 5), 'Код_услуги': rng.randint(1, 3),
+                                  'Сумма': rng.choice([None, None, 100, 250.5, 1000, rng.randint(1, 50)]),
+                                  'Описание': rng.choice([None, "", "Договор", "Доверенность", "Завещание"])}
+                                 for key in range(1, 301)))
+    return db
+
+
+class FakeTree:
+    # Минимальный ttk.Treeview для PagedTreeview: порядок элементов и их значения
+    def __init__(self, columns):
+        self.columns = columns
+        self.items = []
+        self.values = {}
+        self.selected = None
+
+    def __getitem__(self, option):
+        return self.columns
+
+    def heading(self, name, option=None, **options):
+        return str(name)
+
+    def configure(self, **options):
+        pass
+
+    def exists(self, iid):
+        return iid in self.values
+
+    def index(self, iid):
+        return self.items.index(iid)
+
+    def insert(self, parent, index, iid, values):
+        assert iid not in self.values
+        self.items.insert(len(self.items) if index == 'end' else index, iid)
+        self.values[iid] = values
+
+    def delete(self, *iids):
+        for iid in iids:
+            self.items.remove(iid)
+            del self.values[iid]
+
+    def get_children(self):
+        return tuple(self.items)
+
+    def yview(self):
+        return 0.0, 1.0
+
+    def yview_moveto(self, fraction):
+        pass
+
+    def selection_set(self, iid):
+        self.selected = iid
+
+    def see(self, iid):
+        pass
+
+    def after_idle(self, callback):
+        pass
+
+
+@pytest.fixture
+def view(deals):
+    # Окно сделок по 10 строк на страницу, не больше трёх страниц
+    def create(**options):
+        return PagedTreeview(FakeTree(tuple(range(len(COLUMNS['Сделки'])))), deals, 'Сделки', page_size=10,
+                             max_pages=3, **options)
+    return create
+
+
+@pytest.fixture
+def window():
+    # Ключи строк окна; заодно проверяется, что дерево совпадает с keys и упорядочено так же, как выборка
+    def keys(view):
+        assert list(view.tree.items) == [str(view.row_id(key)) for key in view.keys]
+        assert all(not later < earlier for earlier, later in zip(view.keys, view.keys[1:]))
+        return [int(iid) for iid in view.tree.items]
+    return keys
@@ -0,0 +1,96 @@
+import os
+import sqlite3
+
+import pytest
+
+from database import Database, MIGRATIONS
+
+
+def clients(db):
+    return db.connect_db().execute("SELECT Код_клиента, Название FROM Клиенты ORDER BY 1").fetchall()
+
+
+@pytest.fixture
+def office(db):
+    db.import_records('Клиенты', [{'Код_клиента': key, 'Название': f"Клиент {key}"} for key in range(1, 201)])
+    db.import_records('Услуги', [{'Код_услуги': 1, 'Название': "Услуга"}])
+    db.import_records('Сделки', [{'Код_сделки': key, 'Код_клиента': key, 'Код_услуги': 1, 'Сумма': key}
+                                 for key in range(1, 201)])
+    return db
+
+
+def test_backup_and_restore(office, tmp_path):
+    copy = office.backup(str(tmp_path / 'copy.db'), pages=3)
+    before = clients(office)
+    totals = office.report_totals()
+    office.delete_row('Клиенты', 1)
+    office.update_row('Клиенты', (2, "Изменён", None, None, None))
+    # Страница в кэше результатов не должна пережить восстановление
+    assert office.fetch_page('Клиенты', limit=1)[0][1] == "Изменён"
+    files = set(os.listdir(tmp_path))
+    office.restore(copy)
+    assert clients(office) == before
+    assert office.fetch_page('Клиенты', limit=1)[0][1] == "Клиент 1"
+    assert office.report_totals() == totals
+    assert [row[0] for row in office.search('Клиенты', "клиент", limit=1000)] == list(range(1, 201))
+    assert set(os.listdir(tmp_path)) <= files
+    # Копию можно продолжать менять
+    office.insert_row('Клиенты', (500, "Новый", None, None, None))
+    assert clients(office)[-1] == (500, "Новый")
+
+
+def test_backup_during_writes(office, tmp_path):
+    # Запись между шагами копирования начинает его заново; после max_restarts копия снимается за один шаг
+    with Database(office.db_name) as other:
+        updates = iter(range(1000))
+
+        def progress(done, total):
+            other.update_row('Клиенты', (1, f"Правка {next(updates)}", None, None, None))
+
+        copy = office.backup(str(tmp_path / 'copy.db'), pages=1, sleep=0, progress=progress, max_restarts=2)
+    conn = sqlite3.connect(copy)
+    try:
+        assert conn.execute("PRAGMA integrity_check").fetchone() == ('ok',)
+        assert conn.execute("SELECT COUNT(*) FROM Клиенты").fetchone() == (200,)
+    finally:
+        conn.close()
+
+
+def test_restore_refuses_a_broken_file(office, tmp_path):
+    broken = tmp_path / 'broken.db'
+    broken.write_bytes(b"not a database" * 100)
+    files = set(os.listdir(tmp_path))
+    with pytest.raises(ValueError):
+        office.restore(str(broken))
+    with pytest.raises(FileNotFoundError):
+        office.restore(str(tmp_path / 'missing.db'))
+    assert len(clients(office)) == 200
+    assert set(os.listdir(tmp_path)) == files
+
+
+def test_prepare_restore_leaves_the_database_alone(office, tmp_path):
+    copy = office.backup(str(tmp_path / 'copy.db'))
+    office.delete_row('Клиенты', 1)
+    tmp = office.prepare_restore(copy)
+    assert len(clients(office)) == 199
+    office.finish_restore(tmp)
+    assert len(clients(office)) == 200
+    assert not os.path.exists(tmp)
+
+
+def test_restore_migrates_an_old_copy(office, tmp_path):
+    copy = office.backup(str(tmp_path / 'copy.db'))
+    conn = sqlite3.connect(copy)
+    conn.execute(f"PRAGMA user_version = {len(MIGRATIONS) - 1}")
+    conn.commit()
+    conn.close()
+    office.restore(copy)
+    assert office.connect_db().execute("PRAGMA user_version").fetchone() == (len(MIGRATIONS),)
+
+
+def test_rotation(office, tmp_path):
+    directory = str(tmp_path / 'backups')
+    made = [office.rotate_backup(directory, keep=3) for _ in range(5)]
+    assert len(set(made)) == 5
+    assert office.list_backups(directory) == made[:-4:-1]
+    assert sorted(os.listdir(directory)) == sorted(os.path.basename(path) for path in made[-3:])
@@ -0,0 +1,63 @@
+import pytest
+
+from database import Database, SEARCH_COLUMNS
+
+
+def state(db):
+    # Всё, что поддерживают триггеры: итоги, поисковый индекс, журнал и сами триггеры
+    conn = db.connect_db()
+    result = {'triggers': conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' "
+                                       "ORDER BY name").fetchall()}
+    for summary in ('Итоги_общие', 'Итоги_клиентов', 'Итоги_услуг'):
+        result[summary] = conn.execute(f"SELECT * FROM {summary} ORDER BY 1").fetchall()
+    for table_name in SEARCH_COLUMNS:
+        result[table_name] = conn.execute(f"SELECT * FROM {table_name} ORDER BY 1").fetchall()
+        for word in ("договор", "клиент", "обновлён", "услуга"):
+            result[table_name, word] = [row[0] for row in db.search(table_name, word, limit=10000)]
+        # Индекс совпадает с содержимым таблицы
+        conn.execute(f"INSERT INTO {table_name}_поиск ({table_name}_поиск, rank) VALUES ('integrity-check', 1)")
+    # Строка, изменённая в порции дважды, попадает в журнал массовой загрузки один раз
+    result['log'] = sorted(set(conn.execute("SELECT Таблица, Операция, Ключ FROM Журнал_изменений").fetchall()))
+    result['generations'] = conn.execute("SELECT Таблица, Номер > 0 FROM Поколения ORDER BY 1").fetchall()
+    return result
+
+
+def load(db, batch_size, commit_every):
+    # Клиенты и услуги, затем сделки с обновлениями, повторами ключей, строками без ключа и текстом в суммах
+    counts = []
+    for table_name, records in (
+        ('Клиенты', [{'Код_клиента': key, 'Название': f"Клиент {key}"} for key in range(1, 41)]),
+        ('Услуги', [{'Код_услуги': key, 'Название': f"Услуга {key}", 'Описание': "Договор"} for key in range(1, 6)]),
+        ('Сделки', [{'Код_сделки': key, 'Код_клиента': key % 40 + 1, 'Код_услуги': key % 5 + 1,
+                     'Сумма': [100, 2.5, None, '', 7][key % 5], 'Комиссионные': key, 'Описание': f"Договор {key}"}
+                    for key in range(1, 301)]),
+        ('Клиенты', [{'Код_клиента': str(key), 'Название': f"Клиент {key} обновлён"} for key in range(30, 51)]),
+        ('Сделки', [{'Код_сделки': key, 'Код_клиента': 7, 'Код_услуги': key % 5 + 1, 'Сумма': key,
+                     'Комиссионные': key, 'Описание': f"Договор {key}" if key % 2 else "Обновлён"}
+                    for key in range(250, 401)] +
+         [{'Код_сделки': 5, 'Код_клиента': 8, 'Сумма': 1}, {'Код_сделки': 5, 'Код_клиента': 9, 'Сумма': 2}]),
+        # Строки без ключа отдельно: вместе с ключами из файла они заняли бы ключи, которые идут в файле позже
+        ('Сделки', [{'Код_клиента': 3, 'Код_услуги': 1, 'Сумма': 10, 'Описание': "Договор без номера"}] * 30),
+    ):
+        result = db.import_records(table_name, records, batch_size=batch_size, commit_every=commit_every)
+        counts.append((result['rows'], result['inserted'], result['updated'], result['unchanged']))
+    return counts
+
+
+@pytest.mark.parametrize('batch_size, commit_every', [(7, 50), (16, 16), (100, 1000)])
+def test_bulk_import_matches_triggers(tmp_path, batch_size, commit_every):
+    # batch_size больше порции — пачка ни разу не заполняется, и строки проходят через триггеры
+    with Database(str(tmp_path / 'triggers.db')) as expected, Database(str(tmp_path / 'bulk.db')) as db:
+        assert load(db, batch_size, commit_every) == load(expected, 100000, 100000)
+        assert state(db) == state(expected)
+
+
+def test_failed_chunk_keeps_triggers(db):
+    triggers = db.connect_db().execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall()
+    records = [{'Код_клиента': key, 'Название': f"Клиент {key}"} for key in range(1, 20)] + [{'Телефон2': 1}]
+    with pytest.raises(ValueError):
+        db.import_records('Клиенты', records, batch_size=5)
+    assert db.connect_db().execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall() == triggers
+    assert db.connect_db().execute("SELECT COUNT(*) FROM Клиенты").fetchone() == (0,)
+    db.insert_row('Клиенты', (1, "Клиент", None, None, None))
+    assert [row[0] for row in db.search('Клиенты', "клиент")] == [1]
@@ -0,0 +1,92 @@
+import sqlite3
+
+from database import Database, QueryCache
+
+
+def names(db):
+    return [row[1] for row in db.fetch_page('Клиенты')]
+
+
+def test_repeated_reads_hit_the_cache(db):
+    db.import_records('Клиенты', [{'Код_клиента': 1, 'Название': "Клиент"}])
+    assert names(db) == names(db) == ["Клиент"]
+    info = db.cache.info()
+    assert (info['hits'], info['misses']) == (1, 1)
+
+
+def test_writes_invalidate(db):
+    db.import_records('Клиенты', [{'Код_клиента': 1, 'Название': "Клиент"}])
+    db.import_records('Услуги', [{'Код_услуги': 1, 'Название': "Услуга"}])
+    assert names(db) == ["Клиент"]
+    db.insert_row('Клиенты', (2, "Второй", None, None, None))
+    assert names(db) == ["Клиент", "Второй"]
+    db.update_row('Клиенты', (2, "Переименован", None, None, None))
+    assert names(db) == ["Клиент", "Переименован"]
+    # Массовая загрузка обходит построчные триггеры, но поколение всё равно меняется
+    db.import_records('Клиенты', [{'Код_клиента': key, 'Название': "Загружен"} for key in range(1, 21)],
+                      batch_size=5)
+    assert names(db) == ["Загружен"] * 20
+    # Каскадное удаление меняет поколение Сделки, от которого зависят и страницы, и отчёты
+    db.insert_row('Сделки', (1, 1, 1, 100, 10, None))
+    assert len(db.fetch_page('Сделки')) == 1
+    assert db.report('Клиенты')[0][3] == 100.0
+    db.delete_row('Клиенты', 1)
+    assert db.fetch_page('Сделки') == []
+    assert db.report('Клиенты') == []
+    assert db.report_totals()['count'] == 0
+
+
+def test_other_connections_invalidate(db, tmp_path):
+    db.import_records('Клиенты', [{'Код_клиента': 1, 'Название': "Клиент"}])
+    assert names(db) == ["Клиент"]
+    # Другой экземпляр Database (другой поток или процесс приложения)
+    with Database(db.db_name) as other:
+        other.update_row('Клиенты', (1, "Из другого соединения", None, None, None))
+    assert names(db) == ["Из другого соединения"]
+    # Внешний инструмент без Database: поколение меняют триггеры в самой базе
+    conn = sqlite3.connect(db.db_name)
+    with conn:
+        conn.execute("UPDATE Клиенты SET Название = 'Из sqlite3' WHERE Код_клиента = 1")
+    conn.close()
+    assert names(db) == ["Из sqlite3"]
+
+
+def test_transaction_reads_bypass_the_cache(db):
+    db.import_records('Клиенты', [{'Код_клиента': 1, 'Название': "Клиент"}])
+    assert names(db) == ["Клиент"]
+
+    class Rollback(Exception):
+        pass
+
+    try:
+        with db.transaction(immediate=True) as conn:
+            conn.execute("UPDATE Клиенты SET Название = 'Черновик'")
+            assert names(db) == ["Черновик"]
+            raise Rollback()
+    except Rollback:
+        pass
+    assert names(db) == ["Клиент"]
+
+
+def test_cache_budget():
+    cache = QueryCache(max_bytes=20000)
+    rows = [(key, "x" * 50) for key in range(5)]
+    for number in range(20):
+        cache.put(('SELECT', (number,)), (0,), rows)
+    info = cache.info()
+    assert 0 < info['bytes'] <= 20000
+    assert info['entries'] < 20
+    # Вытесняются давно не использованные записи
+    assert cache.get(('SELECT', (19,)), (0,)) == rows
+    assert cache.get(('SELECT', (0,)), (0,)) is None
+    assert cache.get(('SELECT', (19,)), (1,)) is None
+    # Выборка больше четверти бюджета не кэшируется
+    cache.put(('SELECT', ('большая',)), (0,), rows * 10)
+    assert cache.get(('SELECT', ('большая',)), (0,)) is None
+
+
+def test_cache_can_be_disabled(tmp_path):
+    with Database(str(tmp_path / 'nocache.db'), result_cache_bytes=0) as db:
+        assert db.cache is None
+        db.import_records('Клиенты', [{'Код_клиента': 1, 'Название': "Клиент"}])
+        assert names(db) == ["Клиент"]
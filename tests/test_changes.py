@@ -0,0 +1,101 @@
+import gzip
+import json
+
+import pytest
+
+from database import Database
+
+TABLES = ('Клиенты', 'Услуги', 'Сделки')
+
+
+def read(result):
+    opener = gzip.open if result['file'].endswith('.gz') else open
+    with opener(result['file'], 'rt', encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+def replicate(db, replica, since, directory, compress=False):
+    # Перенос изменений всех таблиц после отметки since; возвращает новую отметку
+    watermark, changes = since, {}
+    for table_name in TABLES:
+        file_path = str(directory / f"{table_name}.changes.ndjson{'.gz' if compress else ''}")
+        result = db.export_changes(table_name, since, file_path, compress=compress)
+        watermark = max(watermark, result['watermark'])
+        changes[table_name] = read(result)
+        assert result['changes'] == len(changes[table_name])
+    # Сначала строки родительских таблиц, удаления — в обратном порядке
+    for table_name in TABLES:
+        replica.import_records(table_name, [record['Строка'] for record in changes[table_name]
+                                            if record['Операция'] == 'upsert'])
+    for table_name in reversed(TABLES):
+        for record in changes[table_name]:
+            if record['Операция'] == 'delete':
+                replica.delete_row(table_name, record['Ключ'])
+    return watermark
+
+
+def contents(db):
+    conn = db.connect_db()
+    return {table_name: conn.execute(f"SELECT * FROM {table_name} ORDER BY 1").fetchall() for table_name in TABLES}
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_incremental_replication(db, tmp_path, compress):
+    with Database(str(tmp_path / 'replica.db')) as replica:
+        db.import_records('Клиенты', [{'Код_клиента': key, 'Название': f"Клиент {key}"} for key in range(1, 31)])
+        db.import_records('Услуги', [{'Код_услуги': key, 'Название': f"Услуга {key}"} for key in range(1, 4)])
+        db.import_records('Сделки', [{'Код_сделки': key, 'Код_клиента': key % 30 + 1, 'Код_услуги': key % 3 + 1,
+                                      'Сумма': key} for key in range(1, 101)], batch_size=10)
+        watermark = replicate(db, replica, 0, tmp_path, compress)
+        assert contents(replica) == contents(db)
+
+        db.update_row('Клиенты', (1, "Переименован", None, None, None))
+        db.insert_row('Сделки', (None, 2, 1, 5, None, "Новая"))
+        db.delete_row('Клиенты', 3)  # каскад на сделки клиента
+        db.import_records('Сделки', [{'Код_сделки': key, 'Код_клиента': 4, 'Код_услуги': 1, 'Сумма': -key}
+                                     for key in range(50, 121)], batch_size=10)
+        db.delete_row('Сделки', 60)
+        db.insert_row('Клиенты', (3, "Вернулся", None, None, None))
+        assert db.compact_changes() > 0
+        watermark = replicate(db, replica, watermark, tmp_path, compress)
+        assert contents(replica) == contents(db)
+
+        # Без новых изменений выгрузка пуста, а отметка не меняется
+        assert db.export_changes('Клиенты', watermark, str(tmp_path / 'empty.ndjson'))['changes'] == 0
+        assert replicate(db, replica, watermark, tmp_path) == watermark
+
+
+def test_one_record_per_key(db, tmp_path):
+    db.insert_row('Клиенты', (1, "Первый", None, None, None))
+    for number in range(5):
+        db.update_row('Клиенты', (1, f"Правка {number}", None, None, None))
+    db.insert_row('Клиенты', (2, "Второй", None, None, None))
+    db.delete_row('Клиенты', 2)
+    result = db.export_changes('Клиенты', file_path=str(tmp_path / 'changes.ndjson'))
+    records = read(result)
+    assert [(record['Операция'], record.get('Ключ') or record['Строка']['Название']) for record in records] == [
+        ('upsert', "Правка 4"), ('delete', 2)]
+    assert records == sorted(records, key=lambda record: record['Номер'])
+    assert result['watermark'] == db.change_watermark()
+
+
+def test_primary_key_change_is_a_delete_and_an_insert(db, tmp_path):
+    db.insert_row('Клиенты', (1, "Клиент", None, None, None))
+    with db.transaction(immediate=True) as conn:
+        conn.execute("UPDATE Клиенты SET Код_клиента = 7 WHERE Код_клиента = 1")
+    records = read(db.export_changes('Клиенты', file_path=str(tmp_path / 'changes.ndjson')))
+    assert [(record['Операция'], record.get('Ключ')) for record in records] == [('delete', 1), ('upsert', None)]
+    assert records[1]['Строка']['Код_клиента'] == 7
+
+
+def test_compaction_keeps_the_watermark(db):
+    for key in range(1, 11):
+        db.insert_row('Услуги', (key, f"Услуга {key}", None))
+        db.update_row('Услуги', (key, f"Услуга {key}", "Описание"))
+    watermark = db.change_watermark()
+    assert db.compact_changes() == 10
+    assert db.compact_changes(before=watermark) == 10
+    assert db.connect_db().execute("SELECT COUNT(*) FROM Журнал_изменений").fetchone() == (0,)
+    assert db.change_watermark() == watermark
+    db.insert_row('Услуги', (11, "Услуга 11", None))
+    assert db.change_watermark() == watermark + 1
@@ -0,0 +1,42 @@
+import os
+
+import openpyxl
+import pytest
+
+import database
+
+
+def test_round_trip(db, tmp_path):
+    db.import_records('Услуги', [{'Код_услуги': key, 'Название': f"Услуга {key}", 'Описание': None}
+                                 for key in range(1, 51)])
+    file_path = db.export_to_excel('Услуги', str(tmp_path / "Услуги.xlsx"), chunk_size=7)
+    result = db.import_from_excel('Услуги', file_path, batch_size=8)
+    assert (result['rows'], result['unchanged']) == (50, 50)
+
+
+def test_blank_header_cells_are_skipped(db, tmp_path):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = 'Услуги'
+    sheet.append(['Код_услуги', None, 'Название', None])
+    sheet.append([10, "мусор", "Услуга 10", "ещё"])
+    sheet.append([None, "только мусор", None, None])
+    sheet.append([11, None, "Услуга 11"])
+    file_path = str(tmp_path / "Услуги.xlsx")
+    workbook.save(file_path)
+    result = db.import_from_excel('Услуги', file_path)
+    assert result['rows'] == 2
+    assert db.connect_db().execute("SELECT * FROM Услуги ORDER BY 1").fetchall() == [
+        (10, "Услуга 10", None), (11, "Услуга 11", None)]
+
+
+def test_sheet_row_limit(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'EXCEL_MAX_ROWS', 5)
+    db.import_records('Услуги', [{'Код_услуги': key} for key in range(1, 7)])
+    file_path = str(tmp_path / "Услуги.xlsx")
+    with pytest.raises(ValueError):
+        db.export_to_excel('Услуги', file_path)
+    with pytest.raises(ValueError):
+        db.export_all_to_excel(str(tmp_path / "all.xlsx"))
+    assert not os.path.exists(file_path)
+    assert not os.path.exists(tmp_path / "all.xlsx")
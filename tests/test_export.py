@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+
+def clients(keys):
+    return [{'Код_клиента': key, 'Название': f'Клиент {key}, "]['} for key in keys]
+
+
+@pytest.mark.parametrize('fmt', ['json', 'compact', 'ndjson'])
+@pytest.mark.parametrize('compress', [False, True])
+def test_export_import_round_trip(db, tmp_path, fmt, compress):
+    db.import_records('Клиенты', clients(range(1, 301)) + [{'Код_клиента': 301, 'Название': None, 'Телефон': "\n"}])
+    before = db.connect_db().execute("SELECT * FROM Клиенты ORDER BY Код_клиента").fetchall()
+    file_path = db.export_to_json('Клиенты', str(tmp_path / f"Клиенты.{fmt}{'.gz' if compress else ''}"),
+                                  fmt=fmt, compress=compress, chunk_size=70)
+    result = db.import_from_json('Клиенты', file_path, batch_size=64)
+    assert (result['rows'], result['unchanged']) == (301, 301)
+    db.connect_db().execute("DELETE FROM Клиенты")
+    db.connect_db().commit()
+    result = db.import_from_json('Клиенты', file_path, batch_size=64)
+    assert (result['rows'], result['inserted']) == (301, 301)
+    assert db.connect_db().execute("SELECT * FROM Клиенты ORDER BY Код_клиента").fetchall() == before
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.mark.parametrize('export', [
+    lambda db, file_path, progress: db.export_to_json('Клиенты', file_path, fmt='ndjson', chunk_size=10,
+                                                      progress=progress),
+    lambda db, file_path, progress: db.export_changes('Клиенты', file_path=file_path, chunk_size=10,
+                                                      progress=progress),
+])
+def test_failed_export_keeps_previous_file(db, tmp_path, export):
+    db.import_records('Клиенты', clients(range(1, 101)))
+    # Отдельный каталог: рядом с базой лежат её -wal и -shm
+    directory = tmp_path / 'exports'
+    directory.mkdir()
+    file_path = str(directory / "Клиенты.ndjson")
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.write("прежняя выгрузка")
+
+    def progress(*args):
+        raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        export(db, file_path, progress)
+    with open(file_path, encoding='utf-8') as file:
+        assert file.read() == "прежняя выгрузка"
+    # Временный файл удалён
+    assert os.listdir(directory) == ["Клиенты.ndjson"]
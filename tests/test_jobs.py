@@ -0,0 +1,44 @@
+import time
+
+import main
+
+
+class FakeRoot:
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, delay, callback):
+        self.scheduled.append(callback)
+
+
+def finish(jobs, count):
+    # Дождаться, пока рабочие потоки положат результаты в очередь
+    deadline = time.monotonic() + 5
+    while jobs.results.qsize() < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_failing_callback_keeps_polling(monkeypatch):
+    shown = []
+    monkeypatch.setattr(main.messagebox, 'showerror', lambda *args, **options: shown.append(args))
+    root = FakeRoot()
+    jobs = main.JobRunner(root)
+    delivered = []
+
+    def fail(result):
+        raise ValueError("Неверный формат")
+
+    jobs.submit("Отчёт", lambda job: 1, on_done=fail)
+    jobs.submit("Загрузка", lambda job: 2, on_done=delivered.append, quiet=True)
+    finish(jobs, 2)
+    root.scheduled.pop()()
+    assert shown == [("Отчёт", "Неверный формат")]
+    assert delivered == [2]
+    assert not jobs.jobs and not jobs.running
+    # Опрос продолжается
+    assert len(root.scheduled) == 1
+    jobs.submit("Загрузка", lambda job: 3, on_done=delivered.append)
+    finish(jobs, 1)
+    root.scheduled.pop()()
+    assert delivered == [2, 3]
+    jobs.shutdown()
@@ -0,0 +1,60 @@
+import pytest
+
+TABLE = 'Сделки'
+
+
+def all_keys(db):
+    return [key for key, in db.connect_db().execute(f"SELECT Код_сделки FROM {TABLE} ORDER BY Код_сделки")]
+
+
+@pytest.mark.parametrize('limit', [1, 7, 300, 1000])
+def test_keyset_walks(deals, limit):
+    expected = all_keys(deals)
+    forward, after = [], None
+    while True:
+        page = deals.fetch_page(TABLE, after=after, limit=limit)
+        forward += [row[0] for row in page]
+        if len(page) < limit:
+            break
+        after = page[-1][0]
+    assert forward == expected
+    backward, before = [], expected[-1] + 1
+    while True:
+        page = deals.fetch_page(TABLE, before=before, limit=limit)
+        backward[:0] = [row[0] for row in page]
+        if len(page) < limit:
+            break
+        before = page[0][0]
+    assert backward == expected
+
+
+def test_window_stays_bounded(deals, view, window):
+    expected = all_keys(deals)
+    view = view()
+    view.reload()
+    assert window(view) == expected[:10]
+    assert view.at_start and not view.at_end
+    while not view.at_end:
+        view.load_next()
+        keys = window(view)
+        assert len(keys) <= view.max_rows
+        start = expected.index(keys[0])
+        assert keys == expected[start:start + len(keys)]
+    assert keys == expected[-view.max_rows:]
+    assert not view.at_start
+    while not view.at_start:
+        view.load_previous()
+        assert len(window(view)) <= view.max_rows
+    assert window(view) == expected[:view.max_rows]
+
+
+def test_scrolling_near_the_edge_loads_a_page(deals, view, window):
+    view = view()
+    view.reload()
+    view.tree.yview = lambda: (0.5, 1.0)
+    view.check_window()
+    assert window(view) == all_keys(deals)[:20]
+    # В середине окна ничего не подгружается
+    view.tree.yview = lambda: (0.4, 0.6)
+    view.check_window()
+    assert len(view.keys) == 20
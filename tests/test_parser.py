@@ -0,0 +1,73 @@
+import io
+import json
+
+import pytest
+
+from database import iter_json_records
+
+ARRAYS = {
+    '[{"a": 1}, {"a": 2}]': 2,
+    '[]': 0,
+    '  [ ]  \n': 0,
+    '': 0,
+    ' \n ': 0,
+    '[\n    {\n        "a": 1\n    },\n    {\n        "a": "x,]"\n    }\n]\n': 2,
+    '[{"a": 1}]': 1,
+}
+LINES = {
+    '{"a": 1}\n{"a": 2}\n': 2,
+    '{"a": 1}\r\n\r\n{"a": 2}': 2,
+    '{"a": 1}': 1,
+}
+MALFORMED = [
+    '[{"a": 1}]]]]{"a": 2}',
+    '{"a": 1}{"a": 2}',
+    '{"a": 1} {"a": 2}',
+    '[{"a": 1}, {"a": 2}',
+    '[{"a": 1},',
+    '[{"a": 1},]',
+    '[{"a": 1},,{"a": 2}]',
+    '[{"a": 1} {"a": 2}]',
+    '[{"a": 1}\n{"a": 2}]',
+    '[{"a": 1}]\n{"a": 2}',
+    '[{"a": 1',
+    ',{"a": 1}',
+    ']',
+]
+
+
+def parse(text, chunk_size):
+    return list(iter_json_records(io.StringIO(text), chunk_size))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64 * 1024])
+@pytest.mark.parametrize('text, count', [*ARRAYS.items(), *LINES.items()])
+def test_parser_accepts(text, count, chunk_size):
+    records = parse(text, chunk_size)
+    assert len(records) == count
+    if text.strip():
+        # Там, где json.load применим, результат совпадает с ним
+        expected = json.loads(text) if text.lstrip().startswith('[') else [json.loads(line)
+                                                                          for line in text.splitlines() if line]
+        assert records == expected
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64 * 1024])
+@pytest.mark.parametrize('text', MALFORMED)
+def test_parser_rejects(text, chunk_size):
+    with pytest.raises(json.JSONDecodeError):
+        parse(text, chunk_size)
+
+
+@pytest.mark.parametrize('text', ['[1]', '{"a": 1}\n5', '[{"a": 1}, []]'])
+def test_parser_rejects_non_objects(text):
+    with pytest.raises(ValueError):
+        parse(text, 3)
+
+
+def test_import_of_malformed_file(db, tmp_path):
+    file_path = tmp_path / "Клиенты.json"
+    file_path.write_text('[{"Код_клиента": 1}, {"Код_клиента": 2}]]', encoding='utf-8')
+    with pytest.raises(ValueError):
+        db.import_from_json('Клиенты', str(file_path))
+    assert db.connect_db().execute("SELECT COUNT(*) FROM Клиенты").fetchone() == (0,)
@@ -0,0 +1,23 @@
+def test_insert_with_empty_id(db):
+    db.insert_row('Клиенты', ('5', "Клиент", '', '', ''))
+    changes = db.insert_row('Клиенты', ('', "Новый клиент", '', '', ''))
+    assert changes == {'Клиенты': {'upserted': [(6, "Новый клиент", '', '', '')], 'deleted': []}}
+    changes = db.insert_row('Услуги', (None, "Услуга", None))
+    assert changes == {'Услуги': {'upserted': [(1, "Услуга", None)], 'deleted': []}}
+
+
+def test_changes_for_view_patching(db):
+    db.insert_row('Клиенты', (1, "Клиент", None, None, None))
+    db.insert_row('Услуги', (1, "Услуга", None))
+    for key in (1, 2, 3):
+        db.insert_row('Сделки', (key, 1, 1, key * 100, None, None))
+    # Повторная вставка существующего ключа обновляет строку на месте, без каскада
+    changes = db.insert_row('Клиенты', (1, "Переименован", None, None, None))
+    assert changes == {'Клиенты': {'upserted': [(1, "Переименован", None, None, None)], 'deleted': []}}
+    assert db.update_row('Сделки', (2, 1, 1, 250, 5, "Договор")) == {
+        'Сделки': {'upserted': [(2, 1, 1, 250.0, 5.0, "Договор")], 'deleted': []}}
+    assert db.update_row('Сделки', (9, 1, 1, 1, 1, None)) == {}
+    changes = db.delete_row('Клиенты', 1)
+    assert sorted(changes['Сделки']['deleted']) == [1, 2, 3]
+    assert changes['Клиенты']['deleted'] == [1]
+    assert db.delete_row('Клиенты', 1) == {}
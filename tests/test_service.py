@@ -0,0 +1,82 @@
+import asyncio
+import contextlib
+import os
+import threading
+import time
+
+import pytest
+
+from service import DataService, RemoteDatabase
+
+
+@pytest.fixture
+def remote(db, tmp_path):
+    # Служба на Unix-сокете в отдельном потоке со своим циклом событий; останавливается по событию stop
+    socket_path = str(tmp_path / 'service.sock')
+    service = DataService(db, readers=2, files=str(tmp_path / 'files'))
+    stop = threading.Event()
+
+    async def run():
+        serving = asyncio.ensure_future(service.serve(unix_socket=socket_path))
+        await asyncio.get_running_loop().run_in_executor(None, stop.wait)
+        serving.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await serving
+
+    thread = threading.Thread(target=asyncio.run, args=(run(),))
+    thread.start()
+    while not os.path.exists(socket_path):
+        assert thread.is_alive()
+        time.sleep(0.01)
+    client = RemoteDatabase('unix:' + socket_path, timeout=10)
+    client.files = service.files
+    yield client
+    client.close()
+    stop.set()
+    thread.join()
+
+
+def test_rows_through_service(remote, db):
+    remote.insert_row('Клиенты', (1, "Клиент", None, None, "+7 900"))
+    changes = remote.insert_row('Услуги', (None, "Услуга", None))
+    assert changes['Услуги']['upserted'] == [[1, "Услуга", None]]
+    remote.insert_row('Сделки', (1, 1, 1, 100, 10, "Договор"))
+    remote.update_row('Клиенты', (1, "Новое название", None, None, None))
+    assert db.get_row('Клиенты', 1) == (1, "Новое название", None, None, None)
+    assert remote.fetch_page('Сделки', order_by='Сумма') == [[1, 1, 1, 100.0, 10.0, "Договор"]]
+    assert remote.report_totals()['amount'] == 100.0
+    changes = remote.delete_row('Клиенты', 1)
+    assert changes['Сделки']['deleted'] == [1]
+    with pytest.raises(ValueError):
+        remote.fetch_page('Сделки', order_by='Сумма; DROP TABLE Сделки')
+
+
+@pytest.mark.parametrize('call', [
+    lambda remote: remote.export_to_json('sqlite_master'),
+    lambda remote: remote.export_to_json('Клиенты WHERE 0 UNION SELECT 1, 2, 3, 4, sql FROM sqlite_master'),
+    lambda remote: remote.export_to_excel('sqlite_master'),
+    lambda remote: remote.export_changes('Журнал_изменений'),
+    lambda remote: remote.get_row(['Клиенты'], 1),
+    lambda remote: remote.search('Клиенты_поиск', "x"),
+])
+def test_unknown_tables_are_refused(remote, call):
+    with pytest.raises((ValueError, TypeError)):
+        call(remote)
+    assert os.listdir(remote.files) == []
+
+
+def test_files_stay_in_service_directory(remote, db, tmp_path):
+    db.import_records('Клиенты', [{'Код_клиента': 1, 'Название': "Клиент"}])
+    assert remote.export_to_json('Клиенты', 'Клиенты.json') == os.path.join(remote.files, 'Клиенты.json')
+    assert remote.export_to_json('Клиенты', 'sub/../копия.json') == os.path.join(remote.files, 'копия.json')
+    assert remote.export_to_json('Клиенты', fmt='ndjson') == os.path.join(remote.files, 'Клиенты.ndjson')
+    assert remote.import_from_json('Клиенты', 'копия.json')['unchanged'] == 1
+    assert os.path.dirname(remote.rotate_backup()) == os.path.join(remote.files, 'backups')
+    (tmp_path / 'outside.json').write_text('[]')
+    for call in (lambda: remote.export_to_json('Клиенты', '../outside.json'),
+                 lambda: remote.export_to_json('Клиенты', str(tmp_path / 'outside.json')),
+                 lambda: remote.import_from_json('Клиенты', '../outside.json'),
+                 lambda: remote.rotate_backup('/tmp')):
+        with pytest.raises(PermissionError):
+            call()
+    assert (tmp_path / 'outside.json').read_text() == '[]'
@@ -0,0 +1,126 @@
+import pytest
+
+from database import COLUMNS, PRIMARY_KEYS
+
+TABLE = 'Сделки'
+KEY = PRIMARY_KEYS[TABLE]
+
+
+def ordered(db, order_by=None, descending=False, filters=None):
+    # Эталон: вся таблица одним запросом с обычным ORDER BY
+    where, parameters = db.filter_clause(TABLE, filters)
+    direction = " DESC" if descending else ""
+    order = f"{KEY}{direction}" if order_by is None else f"{order_by}{direction}, {KEY}{direction}"
+    return db.connect_db().execute(f"SELECT * FROM {TABLE}{' WHERE ' + where if where else ''} ORDER BY {order}",
+                                   parameters).fetchall()
+
+
+def cursor_of(row, order_by):
+    return row[0] if order_by is None else (row[COLUMNS[TABLE].index(order_by)], row[0])
+
+
+QUERIES = [
+    {'order_by': 'Сумма'},
+    {'order_by': 'Сумма', 'descending': True},
+    {'order_by': 'Описание'},
+    {'order_by': 'Описание', 'descending': True},
+    {'descending': True},
+    {'filters': {'Код_услуги': 2}},
+    {'order_by': 'Сумма', 'filters': {'Код_клиента': 3}},
+    {'order_by': 'Описание', 'descending': True, 'filters': {'Сумма': (20, 1000)}},
+]
+
+
+@pytest.mark.parametrize('query', QUERIES)
+@pytest.mark.parametrize('limit', [1, 7, 50])
+def test_forward_walk_matches_order_by(deals, query, limit):
+    rows, after = [], None
+    while True:
+        page = deals.fetch_page(TABLE, after=after, limit=limit, **query)
+        rows += page
+        if len(page) < limit:
+            break
+        after = cursor_of(page[-1], query.get('order_by'))
+    assert rows == ordered(deals, **query)
+
+
+@pytest.mark.parametrize('query', QUERIES)
+@pytest.mark.parametrize('limit', [1, 7, 50])
+def test_backward_walk_matches_order_by(deals, query, limit):
+    expected = ordered(deals, **query)
+    rows = expected[-1:]
+    while True:
+        page = deals.fetch_page(TABLE, before=cursor_of(rows[0], query.get('order_by')), limit=limit, **query)
+        rows[:0] = page
+        if len(page) < limit:
+            break
+    assert rows == expected
+
+
+def test_unknown_columns_are_refused(deals):
+    with pytest.raises(ValueError):
+        deals.fetch_page(TABLE, order_by='Сумма; DROP TABLE Сделки')
+    with pytest.raises(ValueError):
+        deals.fetch_page(TABLE, filters={'1 = 1 OR Сумма': 1})
+
+
+def configure(view, query):
+    view.order_by = query.get('order_by')
+    view.descending = query.get('descending', False)
+    view.filters = query.get('filters', {})
+    view.reload()
+    return view
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_view_scrolls_through_table_in_order(deals, view, window, query):
+    expected = [row[0] for row in ordered(deals, **query)]
+    view = configure(view(), query)
+    seen = window(view)
+    while not view.at_end:
+        view.load_next()
+        current = window(view)
+        seen += current[len(current) - len(set(current) - set(seen)):]
+    assert seen == expected
+    while not view.at_start:
+        view.load_previous()
+        window(view)
+    assert window(view) == expected[:len(view.keys)]
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_view_matches_and_show(deals, view, window, query):
+    view = configure(view(), query)
+    expected = [row[0] for row in ordered(deals, **query)]
+    everything = deals.connect_db().execute(f"SELECT * FROM {TABLE}").fetchall()
+    assert [row[0] for row in everything if view.matches(row)] == sorted(expected)
+    for row in everything[::37]:
+        view.show(row)
+        assert view.tree.selected == str(row[0])
+        if view.results:
+            assert row[0] not in expected
+            continue
+        shown = window(view)
+        start = expected.index(shown[0])
+        assert shown == expected[start:start + len(shown)]
+
+
+def test_sort_by_heading(deals, view, window):
+    view = view()
+    view.reload()
+    view.sort('Сумма')
+    assert window(view) == [row[0] for row in ordered(deals, order_by='Сумма')][:10]
+    view.sort('Сумма')
+    assert window(view) == [row[0] for row in ordered(deals, order_by='Сумма', descending=True)][:10]
+    view.sort('Код_сделки')
+    assert (view.order_by, view.descending) == (None, False)
+    assert window(view) == list(range(1, 11))
+
+
+def test_names_instead_of_codes(deals, view):
+    names = {}
+    view = view(lookups={1: 'Клиенты', 2: 'Услуги'}, names=names)
+    view.reload()
+    row = deals.get_row(TABLE, 1)
+    assert view.tree.values['1'][1:3] == [f"Клиент {row[1]} ({row[1]})", f"Услуга {row[2]} ({row[2]})"]
+    assert set(names) == {'Клиенты', 'Услуги'}
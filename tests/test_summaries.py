@@ -0,0 +1,78 @@
+import pytest
+
+from database import Database, MIGRATIONS, SUMMARIES, numeric
+
+
+def expected(db):
+    # Итоги, посчитанные заново по всем сделкам
+    conn = db.connect_db()
+    amount, commission = numeric('Сумма'), numeric('Комиссионные')
+    result = {'Итоги_общие': conn.execute(f"SELECT 1, COUNT(*), TOTAL({amount}), TOTAL({commission}) "
+                                          f"FROM Сделки").fetchall()}
+    for summary, column in SUMMARIES.values():
+        result[summary] = conn.execute(f"SELECT {column}, COUNT(*), TOTAL({amount}), TOTAL({commission}) FROM Сделки "
+                                       f"WHERE {column} IS NOT NULL GROUP BY {column} ORDER BY {column}").fetchall()
+    return result
+
+
+def stored(db):
+    conn = db.connect_db()
+    return {summary: conn.execute(f"SELECT * FROM {summary} ORDER BY 1").fetchall()
+            for summary in ('Итоги_общие', *(summary for summary, _ in SUMMARIES.values()))}
+
+
+@pytest.fixture
+def office(db):
+    db.import_records('Клиенты', [{'Код_клиента': key, 'Название': f"Клиент {key}"} for key in (1, 2, 3)])
+    db.import_records('Услуги', [{'Код_услуги': key, 'Название': f"Услуга {key}"} for key in (1, 2)])
+    return db
+
+
+def test_form_values(office):
+    # Поля формы приходят строками; пустое поле остаётся в столбце REAL текстом
+    office.insert_row('Сделки', ('1', '1', '1', '1000', '', ''))
+    office.insert_row('Сделки', (None, '1', '2', '', '50', "Договор"))
+    office.insert_row('Сделки', (None, '2', None, 'много', None, None))
+    assert stored(office) == expected(office)
+    assert office.report('Клиенты') == [(1, "Клиент 1", 2, 1000.0, 50.0, 500.0), (2, "Клиент 2", 1, 0.0, 0.0, 0.0)]
+    assert office.report_totals() == {'count': 3, 'amount': 1000.0, 'commission': 50.0, 'average': 1000.0 / 3}
+
+
+def test_update_delete_and_cascade(office):
+    for key in range(1, 13):
+        office.insert_row('Сделки', (key, key % 3 + 1, key % 2 + 1, [None, '', 100, 12.5][key % 4], key, None))
+    assert stored(office) == expected(office)
+    office.update_row('Сделки', (1, 3, 1, 'текст', '', "Перенос"))
+    office.update_row('Сделки', (2, None, None, 7, 7, None))
+    office.update_row('Сделки', (3, 1, 2, None, None, None))
+    assert stored(office) == expected(office)
+    office.delete_row('Сделки', 4)
+    office.delete_row('Сделки', 5)
+    assert stored(office) == expected(office)
+    office.delete_row('Клиенты', 1)
+    office.delete_row('Услуги', 2)
+    assert stored(office) == expected(office)
+    assert office.report_row('Клиенты', 1) == {'count': 0, 'amount': 0.0, 'commission': 0.0, 'average': 0.0}
+
+
+def test_import_keeps_summaries(office):
+    office.import_records('Сделки', ({'Код_сделки': key, 'Код_клиента': key % 4 or None, 'Код_услуги': key % 2 + 1,
+                                      'Сумма': [None, '', 10, 2.5, "x"][key % 5], 'Комиссионные': key}
+                                     for key in range(1, 501)))
+    office.import_records('Сделки', ({'Код_сделки': key, 'Код_клиента': 3, 'Сумма': 1} for key in range(250, 751)))
+    assert stored(office) == expected(office)
+
+
+def test_migration_recounts_text_values(tmp_path):
+    path = str(tmp_path / 'old.db')
+    with Database(path) as db:
+        db.import_records('Клиенты', [{'Код_клиента': 1}])
+        db.insert_row('Сделки', (1, 1, None, 1000, '', None))
+        conn = db.connect_db()
+        # Итоги, какими их оставляли прежние триггеры
+        conn.execute("UPDATE Итоги_клиентов SET Комиссионные = ''")
+        conn.execute(f"PRAGMA user_version = {len(MIGRATIONS) - 1}")
+        conn.commit()
+    with Database(path) as db:
+        assert stored(db) == expected(db)
+        assert db.report('Клиенты') == [(1, None, 1, 1000.0, 0.0, 1000.0)]
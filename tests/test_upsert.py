@@ -0,0 +1,64 @@
+import sqlite3
+import threading
+import time
+
+
+def clients(keys, name="Клиент"):
+    return [{'Код_клиента': key, 'Название': f'{name} {key}, "]['} for key in keys]
+
+
+def test_upsert_counts(db):
+    result = db.import_records('Клиенты', clients(range(1, 101)), batch_size=30)
+    assert (result['rows'], result['inserted'], result['updated'], result['unchanged']) == (100, 100, 0, 0)
+    records = clients(range(1, 51)) + clients(range(51, 81), "Изменён") + clients(range(101, 121))
+    result = db.import_records('Клиенты', records, batch_size=30, commit_every=40)
+    assert (result['rows'], result['inserted'], result['updated'], result['unchanged']) == (100, 20, 30, 50)
+    names = dict(db.connect_db().execute("SELECT Код_клиента, Название FROM Клиенты").fetchall())
+    assert len(names) == 120
+    assert names[60] == 'Изменён 60, "]['
+    assert names[90] == 'Клиент 90, "]['
+
+
+def test_upsert_without_key_and_repeated_keys(db):
+    result = db.import_records('Клиенты', [{'Название': "Без кода"}] * 3 + clients([7, 7]))
+    assert (result['inserted'], result['updated'], result['unchanged']) == (4, 0, 1)
+    assert db.connect_db().execute("SELECT COUNT(*) FROM Клиенты").fetchone() == (4,)
+
+
+def test_upsert_keeps_cascaded_rows(db):
+    db.import_records('Клиенты', clients([1]))
+    db.import_records('Услуги', [{'Код_услуги': 1, 'Название': "Услуга"}])
+    db.import_records('Сделки', [{'Код_сделки': 1, 'Код_клиента': 1, 'Код_услуги': 1, 'Сумма': 10}])
+    result = db.import_records('Клиенты', clients([1], "Новое"))
+    assert result['updated'] == 1
+    assert db.connect_db().execute("SELECT COUNT(*) FROM Сделки").fetchone() == (1,)
+
+
+def test_edits_are_not_starved_by_an_import(db):
+    # Каждая порция импорта — отдельная транзакция с немедленной блокировкой; правка из другого потока
+    # ждёт конца порции, а не всего импорта, и не получает "database is locked"
+    db.import_records('Клиенты', clients(range(1, 1001)))
+    done = threading.Event()
+    waits, errors = [], []
+
+    def edit():
+        while not done.is_set():
+            started = time.perf_counter()
+            try:
+                db.update_row('Клиенты', (1, f"Правка {len(waits)}", None, None, None))
+            except sqlite3.Error as e:
+                errors.append(e)
+            waits.append(time.perf_counter() - started)
+
+    thread = threading.Thread(target=edit)
+    thread.start()
+    try:
+        for attempt in range(5):
+            db.import_records('Клиенты', clients(range(1, 3001), f"Импорт {attempt}"), batch_size=100,
+                              commit_every=500)
+    finally:
+        done.set()
+        thread.join()
+    assert errors == []
+    assert len(waits) > 5
+    assert max(waits) < 2